@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
 
 application = get_asgi_application()
+
+# Server processes only; a no-op unless ZODB_PACK_INTERVAL_HOURS is set
+from zodb.zodb_management import start_pack_scheduler
+
+start_pack_scheduler()
@@ -60,6 +60,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "zodb.zodb_management.ZODBConnectionMiddleware",
 ]
 
 CORS_ALLOWED_ORIGINS = [
@@ -122,6 +123,46 @@ elif sys.platform == "darwin":  # macOS
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ZODB_FILE = os.path.join(BASE_DIR, "data", "zodb.fs")
+ZODB_POOL_SIZE = int(os.environ.get("ZODB_POOL_SIZE", 7))
+ZODB_CACHE_SIZE = int(os.environ.get("ZODB_CACHE_SIZE", 2000))
+# Idle read-only connections kept open, separate from ZODB_POOL_SIZE
+ZODB_READ_POOL_SIZE = int(os.environ.get("ZODB_READ_POOL_SIZE", 16))
+# IDs each process reserves per sequence commit
+ZODB_ID_BLOCK_SIZE = int(os.environ.get("ZODB_ID_BLOCK_SIZE", 32))
+# Pack keeps ZODB_PACK_DAYS of history; the scheduler in the WSGI/ASGI
+# process is off at 0
+ZODB_PACK_DAYS = float(os.environ.get("ZODB_PACK_DAYS", 7))
+ZODB_PACK_INTERVAL_HOURS = float(os.environ.get("ZODB_PACK_INTERVAL_HOURS", 0))
+ZODB_PACK_KEEP_OLD = os.environ.get("ZODB_PACK_KEEP_OLD", "false").lower() == "true"
+# ZODB_STORAGE: "file" opens zodb.fs directly (single process); "zeo" connects to a ZEO server
+# started with `manage.py run_zeo_server` so several workers can share it
+ZODB_STORAGE = os.environ.get("ZODB_STORAGE", "file")
+ZODB_ZEO_ADDRESS = os.environ.get("ZODB_ZEO_ADDRESS", "127.0.0.1:8100")
+ZODB_ZEO_BLOB_DIR = os.environ.get("ZODB_ZEO_BLOB_DIR")
+ZODB_ZEO_SHARED_BLOB_DIR = os.environ.get("ZODB_ZEO_SHARED_BLOB_DIR", "true").lower() == "true"
+ZODB_ZEO_CACHE_DIR = os.environ.get("ZODB_ZEO_CACHE_DIR")
+ZODB_ZEO_CLIENT = os.environ.get("ZODB_ZEO_CLIENT", "api")
+ZODB_ZEO_CACHE_SIZE = int(os.environ.get("ZODB_ZEO_CACHE_SIZE", 64 * 1024 * 1024))
+# "relstorage" keeps ZODB in PostgreSQL (the default database unless
+# ZODB_RELSTORAGE_DSN is set); copy an existing zodb.fs with
+# `manage.py migrate_zodb_to_relstorage`
+ZODB_RELSTORAGE_DSN = os.environ.get("ZODB_RELSTORAGE_DSN")
+ZODB_RELSTORAGE_KEEP_HISTORY = os.environ.get("ZODB_RELSTORAGE_KEEP_HISTORY", "false").lower() == "true"
+ZODB_RELSTORAGE_BLOB_DIR = os.environ.get("ZODB_RELSTORAGE_BLOB_DIR")
+ZODB_RELSTORAGE_SHARED_BLOB_DIR = os.environ.get("ZODB_RELSTORAGE_SHARED_BLOB_DIR", "false").lower() == "true"
+ZODB_RELSTORAGE_BLOB_CACHE_SIZE = int(os.environ.get("ZODB_RELSTORAGE_BLOB_CACHE_SIZE", 512 * 1024 * 1024))
+ZODB_RELSTORAGE_CACHE_MB = int(os.environ.get("ZODB_RELSTORAGE_CACHE_MB", 64))
+# Blob downloads: "" streams them from Django; "x-accel" (nginx) or
+# "x-sendfile" (Apache/lighttpd) has the front proxy send the committed file.
+# ZODB_BLOB_ROOT defaults to the storage's blob directory.
+ZODB_BLOB_SERVE = os.environ.get("ZODB_BLOB_SERVE", "")
+ZODB_BLOB_ROOT = os.environ.get("ZODB_BLOB_ROOT")
+ZODB_BLOB_ACCEL_PREFIX = os.environ.get("ZODB_BLOB_ACCEL_PREFIX", "/_blobs/")
+# Signed, expiring download URLs checked by the proxy (nginx secure_link);
+# off unless ZODB_BLOB_URL_SECRET is set
+ZODB_BLOB_URL_SECRET = os.environ.get("ZODB_BLOB_URL_SECRET")
+ZODB_BLOB_URL_TTL = int(os.environ.get("ZODB_BLOB_URL_TTL", 300))
+ZODB_BLOB_SIGNED_PREFIX = os.environ.get("ZODB_BLOB_SIGNED_PREFIX", "/signed-blobs/")
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
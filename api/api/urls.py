@@ -25,6 +25,7 @@ import app_api.products.view as product_views
 import app_api.orders.view as order_views
 import app_api.reviews.view as review_views
 import app_api.digitalhomes.view as digitalhome_views
+import zodb.view as zodb_views
 
 urlpatterns = [
     path('users/admin/register/', account_views.register_admin),
@@ -61,9 +62,14 @@ urlpatterns = [
     path('products/get_3d_model/<int:model_id>/', product_views.get_3d_model),
     path('products/get_display_scene/<int:display_scene_id>/', product_views.get_display_scene),
     path('products/get_texture/<int:model_id>/', product_views.get_textures),
+    path('products/texture_manifest/<int:model_id>/', product_views.get_texture_manifest),
+    path('products/texture/<int:model_id>/<int:texture_id>/', product_views.get_texture_file),
+    path('products/image/<int:image_id>/<str:size>/', product_views.get_product_image),
     path('products/update/', product_views.update_product),
     path('products/delete/<int:product_id>/', product_views.delete_product),
     path('products/list/', product_views.get_products),
+    path('products/suggest/', product_views.get_product_suggestions),
+    path('products/facets/', product_views.get_product_facets),
     path('products/categories/', product_views.get_all_categories),
     path('products/types/', product_views.get_all_product_types),
     path('carts/add_item/', cart_views.add_to_cart),
@@ -89,7 +95,10 @@ urlpatterns = [
     path('digitalhomes/get_digital_homes/', digitalhome_views.get_digital_homes),
     path('digitalhomes/get_digital_home/<int:id>/', digitalhome_views.get_digital_home),
     path('digitalhomes/download_digital_home/<int:home_id>/', digitalhome_views.get_home_model),
+    path('digitalhomes/download_digital_home_url/<int:home_id>/', digitalhome_views.get_home_model_url),
     path('digitalhomes/get_textures/<int:home_id>/', digitalhome_views.get_textures),
+    path('digitalhomes/texture_manifest/<int:home_id>/', digitalhome_views.get_texture_manifest),
+    path('digitalhomes/texture/<int:home_id>/<int:texture_id>/', digitalhome_views.get_texture_file),
     path('digitalhomes/delete_digital_home/<int:id>/', digitalhome_views.delete_digital_home),
     path('digitalhomes/update_texture/', digitalhome_views.update_texture),
     path('digitalhomes/update_home_design/', digitalhome_views.update_home_design),
@@ -97,4 +106,5 @@ urlpatterns = [
     path('digitalhomes/get_deployed_items_details/<int:id>/', digitalhome_views.get_deployed_item_details),
     path('digitalhomes/get_deployed_item_detail/<int:id>/', digitalhome_views.get_deployed_item_detail),
     path('digitalhomes/overlap_check/', digitalhome_views.check_overlap),
+    path('zodb/stats/', zodb_views.get_zodb_stats),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
 
 application = get_wsgi_application()
+
+# Server processes only; a no-op unless ZODB_PACK_INTERVAL_HOURS is set
+from zodb.zodb_management import start_pack_scheduler
+
+start_pack_scheduler()
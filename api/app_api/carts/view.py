@@ -14,7 +14,7 @@ from .funcHelper import *
 @login_required
 @require_http_methods(["POST"])
 def add_to_cart(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -71,13 +71,12 @@ def add_to_cart(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
 
 @csrf_exempt
 @login_required
 @require_http_methods(["DELETE"])
 def decrease_cart_item_quantity(request, cart_item_id):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -109,13 +108,12 @@ def decrease_cart_item_quantity(request, cart_item_id):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
         
 @csrf_exempt
 @login_required
 @require_http_methods(["PUT"])
 def increase_cart_item_quantity(request, cart_item_id):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -148,13 +146,12 @@ def increase_cart_item_quantity(request, cart_item_id):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
 
 @csrf_exempt
 @login_required
 @require_http_methods(["DELETE"])
 def remove_from_cart(request, cart_item_id):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -181,12 +178,11 @@ def remove_from_cart(request, cart_item_id):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
 
 @login_required
 @require_http_methods(["GET"])
 def view_cart(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -221,7 +217,6 @@ def view_cart(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
 
 @csrf_exempt
 @login_required
@@ -247,7 +242,7 @@ def clear_cart(request):
 @login_required
 @require_http_methods(["GET"])
 def get_cart_summary(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         data = parse_request_body(request) or request.GET.dict()
 
@@ -281,5 +276,4 @@ def get_cart_summary(request):
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
     finally:
-        transaction.abort()
-        connection.close()
\ No newline at end of file
+        transaction.abort()
\ No newline at end of file
@@ -6,7 +6,7 @@ from zodb.zodb_management import *
 from ZODB.blob import Blob
 from app_api.digitalhomes.homeObject import Home3D
 from app_api.digitalhomes.models import SRID_3D
-from app_api.products.product_func import create_Texture, delete_texture, fetch_3d_model
+from app_api.products.product_func import create_Texture, delete_texture, fetch_3d_model, acquire_asset, release_asset, retain_product_image
 from trimesh.collision import CollisionManager
 from django.core.files.uploadedfile import SimpleUploadedFile
 import numpy as np
@@ -71,51 +71,29 @@ def create_home_spatial_instance(file):
     return spatial_id
 
 def get_home_object_id(root):
-    if not root.digitalHomes:
-        return 1
-    existing_ids = [
-        int(key)
-        for key in root.digitalHomes.keys()
-    ]
-    return max(existing_ids) + 1
+    return next_id("digitalHomes")
 
 def get_model_id(root):
-    if not root.homeObjectModels:
-        return 1
-    existing_ids = [
-        int(key)
-        for key in root.homeObjectModels.keys()
-    ]
-    return max(existing_ids) + 1
+    return next_id("homeObjectModels")
 
 def create_home_model(root, model_file, texture_files=None):
     try:
         model_id = get_model_id(root)
         filename = getattr(model_file, 'name', f'model_{model_id}.glb')
         
-        file_content = model_file.read()
-        blob = Blob()
-        with blob.open('w') as f:
-            if isinstance(file_content, (bytes, bytearray)):
-                f.write(file_content)
-            else:
-                f.write(file_content.encode('latin-1'))
+        asset = acquire_asset(root, model_file)
 
         texture_ids = []
-        texture_id = None
         if texture_files:
             for tex in texture_files:
-                if texture_id is None:
-                    texture_id = create_Texture(tex, root)
-                else:
-                    texture_id = create_Texture(tex, root, texture_id)
-                texture_ids.append(texture_id)
+                texture_ids.append(create_Texture(tex, root))
         
         root.homeObjectModels[model_id] = Home3D(
             id=model_id,
-            file=blob,
+            file=asset.get_blob(),
             filename=filename,
-            textures=texture_ids
+            textures=texture_ids,
+            digest=asset.get_digest()
         )
         transaction.commit()
         return model_id
@@ -126,14 +104,11 @@ def create_home_model(root, model_file, texture_files=None):
             pass
         raise
     
-def fetch_home_model(home_id: int):
-    _, root = get_connection()
+def fetch_home_model(root, home_id: int):
     home_models = root.homeObjectModels
     if not home_models:
         return None
-    if not home_models[home_id]:
-        return None
-    return home_models[home_id]
+    return home_models.get(home_id)
         
 def delete_home_3d_assets(root, home_id):
     try:
@@ -146,6 +121,7 @@ def delete_home_3d_assets(root, home_id):
         for texture_id in model.get_textures():
             delete_texture(texture_id, root)
 
+        release_asset(root, model.get_digest())
         del home_models[home_id]
 
     except Exception:
@@ -269,6 +245,8 @@ def update_deployed_item(root, item_id, id, item_data):
                 created_at=current_date
             )
             item = root.containerOwnedItems[key_item]
+            item.set_image_id(copy_item.get_image_id())
+            retain_product_image(root, copy_item.get_image_id())
             item.set_contained_item(item_data.get('contain', []))
         else:
             copy_item = root.nonContainerOwnedItems.get(str(item_id))
@@ -290,6 +268,8 @@ def update_deployed_item(root, item_id, id, item_data):
                 created_at=current_date
             )
             item = root.nonContainerOwnedItems[key_item]
+            item.set_image_id(copy_item.get_image_id())
+            retain_product_image(root, copy_item.get_image_id())
             item.set_composition(item_data.get('composite', []))
         
         spatial_id = create_spatial_instance()
@@ -314,7 +294,7 @@ def update_deployed_item(root, item_id, id, item_data):
         ])
     
     if item_data.get('texture_id') is not None:
-        model = fetch_3d_model(item.get_model_id())
+        model = fetch_3d_model(root, item.get_model_id())
         if item_data.get('texture_id') not in model.get_textures():
             raise ValueError("Texture does not belong to the item's 3D model")
         item.set_texture_id(item_data.get('texture_id'))
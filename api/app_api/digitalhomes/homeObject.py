@@ -45,11 +45,14 @@ class HomeObject(persistent.Persistent):
         return self.updated_at
     
 class Home3D(persistent.Persistent):
-    def __init__(self, id, file, filename, textures=None):
+    digest = None
+
+    def __init__(self, id, file, filename, textures=None, digest=None):
         self.id = id
         self.file = file
         self.filename = filename
         self.textures = textures if textures else []
+        self.digest = digest
 
     def get_home_id(self):
         return self.home_id
@@ -61,4 +64,7 @@ class Home3D(persistent.Persistent):
         return self.file
     
     def get_textures(self):
-        return self.textures
\ No newline at end of file
+        return self.textures
+
+    def get_digest(self):
+        return self.digest
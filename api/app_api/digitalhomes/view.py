@@ -1,24 +1,24 @@
-from django.http import FileResponse, JsonResponse
+from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from app_api.products.objectModels import ContainerOwnedItem, NonContainerOwnedItem
 from app_api.products.models import SpatialData
 from zodb.zodb_management import *
+from zodb.blob_serving import blob_response, blob_url_signing_enabled, signed_blob_url
 from app_api.digitalhomes.homeObject import HomeObject
 from app_api.digitalhomes.models import HomeSpatialData
 from app_api.digitalhomes.funcHelper import *
-from app_api.products.product_func import fetch_texture, create_3d_model
+from app_api.products.product_func import create_3d_model, create_product_image, image_fields, texture_base64, texture_manifest, texture_response
 from app_api.orders.funcHelper import create_spatial_instance, get_container_owned_item_id, get_noncontainer_owned_item_id
 from datetime import datetime
 import transaction
 import json
-import base64
 
 @login_required
 @require_http_methods(["GET"])
 def list_available_items(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
         available_items = []
@@ -37,7 +37,7 @@ def list_available_items(request):
                     'name': item.get_name(),
                     'description': item.get_description(),
                     'model_id': item.get_model_id(),
-                    'image': item.get_image(),
+                    **image_fields(item),
                     'category': item.get_category(),
                     'type': item.get_type(),
                     'is_container': is_container,
@@ -52,13 +52,12 @@ def list_available_items(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
 
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
 def get_specific_item(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
         
@@ -89,7 +88,7 @@ def get_specific_item(request):
             'type': item.get_type(),
             'is_container': is_container,
             'created_at': item.created_at.isoformat(),
-            'image': item.get_image(),
+            **image_fields(item),
             'wall_mountable': item.is_wall_mountable(),
         }
         return JsonResponse({'item': item_data}, status=200)
@@ -97,13 +96,12 @@ def get_specific_item(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
         
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
 def add_digital_home(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -138,56 +136,51 @@ def add_digital_home(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
         
 @login_required
 @require_http_methods(["GET"])
 def get_digital_homes(request):
-    connection, root = get_connection()
+    root = request.zodb_read.root
     try:
-        with transaction.manager:
-            customer = request.user.customer
+        customer = request.user.customer
 
-            if not customer:
-                return JsonResponse({'error': 'Only customers can view digital homes'}, status=403)
+        if not customer:
+            return JsonResponse({'error': 'Only customers can view digital homes'}, status=403)
 
-            digital_homes = []
-            for home_id in customer.digital_home:
-                try:
-                    home = root.digitalHomes[home_id]
-                    spatial_id = home.get_spatialData_id()
-                    spatial_data = HomeSpatialData.objects.get(id=spatial_id)
-                    position = get_position(spatial_id)
-                    rotation = parse_coordinates(spatial_data.rotation)
-                    scale = parse_coordinates(spatial_data.scale)
-                    digital_homes.append({
-                        'id': home.get_id(),
-                        'name': home.get_name(),
-                        'home_id': home.get_home_id(),
-                        'deployedItems': home.get_deployedItems(),
-                        'spatialData': {
-                            'id': spatial_data.id,
-                            'positions': position,
-                            'rotation': rotation,
-                            'scale': scale,
-                            'boundary': spatial_data.boundary,
-                        },
-                        'texture_id': home.get_texture_id(),
-                        'created_at': home.get_created_at().isoformat(),
-                        'updated_at': home.get_updated_at().isoformat(),
-                    })
-                except (KeyError, TypeError):
-                    continue
-            return JsonResponse({'digital_homes': digital_homes}, status=200)
+        digital_homes = []
+        for home_id in customer.digital_home:
+            try:
+                home = root.digitalHomes[home_id]
+                spatial_id = home.get_spatialData_id()
+                spatial_data = HomeSpatialData.objects.get(id=spatial_id)
+                position = get_position(spatial_id)
+                rotation = parse_coordinates(spatial_data.rotation)
+                scale = parse_coordinates(spatial_data.scale)
+                digital_homes.append({
+                    'id': home.get_id(),
+                    'name': home.get_name(),
+                    'home_id': home.get_home_id(),
+                    'deployedItems': home.get_deployedItems(),
+                    'spatialData': {
+                        'id': spatial_data.id,
+                        'positions': position,
+                        'rotation': rotation,
+                        'scale': scale,
+                        'boundary': spatial_data.boundary,
+                    },
+                    'texture_id': home.get_texture_id(),
+                    'created_at': home.get_created_at().isoformat(),
+                    'updated_at': home.get_updated_at().isoformat(),
+                })
+            except (KeyError, TypeError):
+                continue
+        return JsonResponse({'digital_homes': digital_homes}, status=200)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
-    finally:
-        transaction.abort()
-        connection.close()
 @login_required
 @require_http_methods(["GET"])
 def get_digital_home(request, id):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -226,13 +219,12 @@ def get_digital_home(request, id):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
         
 @require_http_methods(["GET"])
 @login_required
 def get_home_model(request, home_id):
     try:
-        model = fetch_home_model(home_id)
+        model = fetch_home_model(request.zodb.root, home_id)
         if not model:
             return JsonResponse({'error': 'Model not found'}, status=404)
 
@@ -240,8 +232,27 @@ def get_home_model(request, home_id):
         if blob is None:
             return JsonResponse({'error': 'Model file not found'}, status=404)
 
-        response = FileResponse(blob.open('r'), as_attachment=True, filename=model.get_filename())
-        return response
+        return blob_response(request, blob, model.get_filename(), private=True, digest=model.get_digest())
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+# Short-lived link the front proxy can serve without a session
+@require_http_methods(["GET"])
+@login_required
+def get_home_model_url(request, home_id):
+    try:
+        if not blob_url_signing_enabled():
+            return JsonResponse({'error': 'Signed download URLs are not enabled'}, status=404)
+        model = fetch_home_model(request.zodb.root, home_id)
+        if not model:
+            return JsonResponse({'error': 'Model not found'}, status=404)
+
+        blob = model.get_file()
+        if blob is None:
+            return JsonResponse({'error': 'Model file not found'}, status=404)
+
+        url, expires = signed_blob_url(blob)
+        return JsonResponse({'url': url, 'expires': expires, 'filename': model.get_filename()}, status=200)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
     
@@ -249,24 +260,53 @@ def get_home_model(request, home_id):
 @login_required
 def get_textures(request, home_id):
     try:
-        model = fetch_home_model(home_id)
+        model = fetch_home_model(request.zodb.root, home_id)
         if not model:
             return JsonResponse({'error': 'Model not found'}, status=404)
 
         texture_files = []
         for tex_id in model.get_textures():
-            texture = fetch_texture(tex_id)
-            texture_files.append({'texture_id': tex_id, 'file': texture})
+            texture = get_asset(request.zodb.root, "textures", tex_id)
+            texture_files.append({'texture_id': tex_id, 'file': texture_base64(texture) if texture else None})
 
         return JsonResponse({'textures': texture_files}, status=200)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+@require_http_methods(["GET"])
+@login_required
+def get_texture_manifest(request, home_id):
+    try:
+        model = fetch_home_model(request.zodb.root, home_id)
+        if not model:
+            return JsonResponse({'error': 'Model not found'}, status=404)
+
+        textures = texture_manifest(request.zodb.root, model.get_textures(), f"/digitalhomes/texture/{home_id}/")
+        return JsonResponse({'textures': textures}, status=200)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@require_http_methods(["GET"])
+@login_required
+def get_texture_file(request, home_id, texture_id):
+    try:
+        model = fetch_home_model(request.zodb.root, home_id)
+        if not model or texture_id not in model.get_textures():
+            return JsonResponse({'error': 'Texture not found'}, status=404)
+
+        texture = get_asset(request.zodb.root, "textures", texture_id)
+        if texture is None:
+            return JsonResponse({'error': 'Texture not found'}, status=404)
+
+        return texture_response(request, texture, private=True)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
     
 @csrf_exempt
 @login_required
 @require_http_methods(["DELETE"])
 def delete_digital_home(request, id):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -293,13 +333,12 @@ def delete_digital_home(request, id):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
         
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
 def update_texture(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         home_id = request.POST.get('home_id')
         texture_files = request.FILES.getlist('texture_files')
@@ -315,13 +354,12 @@ def update_texture(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
         
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
 def add_custom_item(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         
         customer = request.user.customer
@@ -338,10 +376,6 @@ def add_custom_item(request):
         image = request.FILES.get('image')
         wall_mountable = request.POST.get('wall_mountable', 'false').lower() == 'true'
         
-        image_base64 = None
-        if image:
-            image_base64 = base64.b64encode(image.read()).decode('utf-8')
-        
         if not name:
             return JsonResponse({'error': 'Name is required'}, status=400)
         
@@ -350,6 +384,7 @@ def add_custom_item(request):
         
         spatial_id = create_spatial_instance()
         current_time = datetime.now()
+        image_id = create_product_image(root, image) if image else None
         if model_files:
             model_id = create_3d_model(root, model_files, texture_files)
         elif category.lower() == 'wallpaper':
@@ -363,7 +398,7 @@ def add_custom_item(request):
                 name=name,
                 description=description,
                 model_id=model_id,
-                image=image_base64,
+                image=None,
                 category=category,
                 type=type,
                 is_container=is_container,
@@ -373,6 +408,7 @@ def add_custom_item(request):
                 created_at=current_time,
                 wall_mountable=wall_mountable
             )
+            categorizedItem.set_image_id(image_id)
             root.containerOwnedItems[str(container_id)] = categorizedItem
         else:
             noncontainer_id = get_noncontainer_owned_item_id(root)
@@ -382,7 +418,7 @@ def add_custom_item(request):
                 name=name,
                 description=description,
                 model_id=model_id,
-                image=image_base64,
+                image=None,
                 category=category,
                 type=type,
                 is_container=is_container,
@@ -392,6 +428,7 @@ def add_custom_item(request):
                 created_at=current_time,
                 wall_mountable=wall_mountable
             )
+            categorizedItem.set_image_id(image_id)
             root.nonContainerOwnedItems[str(noncontainer_id)] = categorizedItem
         transaction.commit()
         customer.owned_digital_products.append({ 'id': categorizedItem.get_id(), 'is_container': categorizedItem.is_container})
@@ -401,13 +438,12 @@ def add_custom_item(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
         
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
 def update_home_design(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         home_id = request.POST.get('id')
         deployed_items_raw = request.POST.get('deployedItems')
@@ -437,13 +473,12 @@ def update_home_design(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
 
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
 def get_deployed_item_details(request, id):
-    connection, root = get_connection()
+    root = request.zodb_read.root
     try:
         home = root.digitalHomes[int(id)]
         deployed_items_details = []
@@ -481,7 +516,7 @@ def get_deployed_item_details(request, id):
                 'containered_item': item.get_contained_item() if is_container else None,
                 'composite': item.get_composition() if not is_container else None,
                 'created_at': item.created_at.isoformat(),
-                'image': item.get_image(),
+                **image_fields(item),
             }
             extra = getattr(item, 'wallpaper_scene_json', None)
             if extra:
@@ -493,15 +528,12 @@ def get_deployed_item_details(request, id):
         return JsonResponse({'deployed_items': deployed_items_details}, status=200)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
-    finally:
-        transaction.abort()
-        connection.close()
 
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])        
 def get_deployed_item_detail(request, id):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         item_id = request.POST.get('item_id')
         is_container = request.POST.get('is_container', 'false').lower() == 'true'
@@ -539,7 +571,7 @@ def get_deployed_item_detail(request, id):
             'containered_item': item.get_contained_item() if is_container else None,
             'composite': item.get_composition() if not is_container else None,
             'created_at': item.created_at.isoformat(),
-            'image': item.get_image(),
+            **image_fields(item),
         }
         extra = getattr(item, 'wallpaper_scene_json', None)
         if extra:
@@ -552,7 +584,6 @@ def get_deployed_item_detail(request, id):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
         
 
 @csrf_exempt
@@ -569,7 +600,7 @@ def check_overlap(request):
         model_details_list = json.loads(model_details_list_json)
 
         main_model_id = list(main_model_details.keys())[0]
-        main_model = fetch_3d_model(main_model_id)
+        main_model = fetch_3d_model(request.zodb.root, main_model_id)
         if not main_model:
             return JsonResponse({'status': 'error', 'message': 'Main model not found'}, status=404)
 
@@ -590,7 +621,7 @@ def check_overlap(request):
         results = []
         contain_overlap = False
         for model_id, details in model_details_list.items():
-            model = fetch_3d_model(model_id)
+            model = fetch_3d_model(request.zodb.root, model_id)
             if not model:
                 return JsonResponse({'status': 'error', 'message': f'Model {model_id} not found'}, status=404)
 
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.management.base import BaseCommand
+import transaction
+import ZODB
+from ZODB.blob import Blob, BlobStorage
+from ZODB.MappingStorage import MappingStorage
+from app_api.products.product_func import write_upload_blob
+
+MIB = 1024 * 1024
+
+# What the model views did before: the whole upload read into memory
+def read_whole(upload):
+    blob = Blob()
+    with blob.open('w') as f:
+        f.write(upload.read())
+    return blob
+
+def temporary_upload(size_mb):
+    upload = TemporaryUploadedFile('model.glb', 'model/gltf-binary', size_mb * MIB, None)
+    chunk = os.urandom(MIB)
+    for _ in range(size_mb):
+        upload.write(chunk)
+    upload.flush()
+    upload.seek(0)
+    return upload
+
+# Same bytes without temporary_file_path(), so write_upload_blob copies in chunks
+def stream_upload(size_mb):
+    upload = temporary_upload(size_mb)
+    return UploadedFile(upload.file, upload.name, upload.content_type, upload.size), upload
+
+class Command(BaseCommand):
+    help = "Peak Python memory and time for storing a large upload as a blob, on a throwaway blob storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=200)
+
+    def measure(self, db, write, upload):
+        connection = db.open()
+        try:
+            tracemalloc.start()
+            started = time.perf_counter()
+            connection.root()['model'] = write(upload)
+            transaction.commit()
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return elapsed * 1000, peak
+        finally:
+            transaction.abort()
+            connection.close()
+
+    def handle(self, *args, **options):
+        size_mb = options['size_mb']
+        blob_dir = tempfile.mkdtemp(prefix='bench_blob_upload_')
+        db = ZODB.DB(BlobStorage(blob_dir, MappingStorage()))
+        try:
+            self.stdout.write(f"{size_mb} MiB upload")
+            cases = {
+                'read()': lambda: (read_whole, temporary_upload(size_mb), None),
+                'chunked copy': lambda: (write_upload_blob, *stream_upload(size_mb)),
+                'consumeFile': lambda: (write_upload_blob, temporary_upload(size_mb), None),
+            }
+            for name, case in cases.items():
+                write, upload, owner = case()
+                try:
+                    ms, peak = self.measure(db, write, upload)
+                finally:
+                    (owner or upload).close()
+                self.stdout.write(f"{name:>14}: peak {peak / MIB:9.2f} MiB {ms:10.1f} ms")
+        finally:
+            db.close()
+            shutil.rmtree(blob_dir, ignore_errors=True)
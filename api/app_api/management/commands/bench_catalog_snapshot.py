@@ -0,0 +1,122 @@
+import random
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+import ZODB
+import transaction
+from zodb.zodb_management import _create_catalog_version, _create_root_trees
+from app_api.products.catalog_snapshot import CatalogSnapshot
+from app_api.products.objectModels import Item, Product
+from app_api.products.product_facets import product_facets
+from app_api.products.product_index import *
+
+CATEGORIES = ['chair', 'table', 'sofa', 'bed', 'lamp', 'shelf', 'cabinet', 'decor']
+
+# Synthetic indexed catalog on an in-memory storage
+def build_catalog(count):
+    db = ZODB.DB(None, cache_size=count * 3)
+    connection = db.open()
+    root = connection.root()
+    _create_root_trees(root)
+    _create_catalog_version(root)
+    transaction.commit()
+    rng = random.Random(0)
+    started = datetime(2024, 1, 1)
+    for product_id in range(1, count + 1):
+        item = Item(
+            id=product_id,
+            name=f"product {product_id}",
+            description="",
+            model_id=None,
+            image=None,
+            category=rng.choice(CATEGORIES),
+            type='furniture',
+            is_container=False,
+            created_at=started + timedelta(minutes=rng.randrange(500000)),
+        )
+        digital_price = round(rng.uniform(1, 500), 2) if rng.random() < 0.9 else None
+        product = Product(
+            id=product_id,
+            item=item,
+            digital_price=digital_price,
+            physical_price=round(rng.uniform(10, 5000), 2),
+            stock=10,
+            digital_available=digital_price is not None,
+            physical_available=True,
+            display_scenes=[],
+        )
+        product.set_rating(round(rng.uniform(0, 5), 2))
+        root.products[product_id] = product
+        index_product(root, product)
+        if product_id % 10000 == 0:
+            transaction.commit()
+    root.productIndexVersion = PRODUCT_INDEX_VERSION
+    transaction.commit()
+    return db, connection, root
+
+# Per-object loop with the same price rule and Python sort as products/list/
+def filter_loop(root, category, min_price, max_price, sort_by):
+    name, descending = SORT_MODES[sort_by]
+    rows = []
+    for product in root.products.values():
+        item = product.get_item()
+        if category.lower() != item.get_category().lower():
+            continue
+        if (product.get_digital_price() is not None and product.get_digital_price() < float(min_price)) and (product.get_physical_price() is not None and product.get_physical_price() < float(min_price)):
+            continue
+        if (product.get_digital_price() is not None and product.get_digital_price() > float(max_price)) and (product.get_physical_price() is not None and product.get_physical_price() > float(max_price)):
+            continue
+        rows.append(product_sort_key(product, sort_by))
+    return order_sort_keys(rows, descending)
+
+class Command(BaseCommand):
+    help = "Compare the per-object filter loop with the columnar catalog snapshot on a synthetic in-memory catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--changes', type=int, default=100, help="Products rewritten before the incremental refresh")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def timed(self, fn, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000, result
+
+    def handle(self, *args, **options):
+        count, repeat = options['products'], options['repeat']
+        db, connection, root = build_catalog(count)
+        try:
+            build_ms, snapshot = self.timed(lambda: CatalogSnapshot.build(root, catalog_version(root)), 1)
+            self.stdout.write(f"{count} products, snapshot build {build_ms:.1f} ms")
+
+            category, min_price, max_price = CATEGORIES[0], 100, 1000
+            for sort_by in ('popularity', 'digital_price_low_to_high', 'newest'):
+                loop_ms, expected = self.timed(lambda: filter_loop(root, category, min_price, max_price, sort_by), repeat)
+                def vectorized():
+                    rows = snapshot.select(category=category, min_price=min_price, max_price=max_price)
+                    return snapshot.ordered_keys(rows, sort_by)
+                snapshot_ms, keys = self.timed(vectorized, repeat)
+                self.stdout.write(
+                    f"{sort_by:>26}: loop {loop_ms:8.2f} ms, snapshot {snapshot_ms:7.2f} ms, "
+                    f"{loop_ms / snapshot_ms:6.1f}x, {len(keys)} rows{'' if keys == expected else '  MISMATCH'}"
+                )
+
+            # Facet counts must use the same price rule as the list
+            facet_total = product_facets(root, category=category, min_price=min_price, max_price=max_price)['total']
+            if facet_total != len(expected):
+                raise CommandError(f"facet total {facet_total} != list total {len(expected)} for {min_price}-{max_price}")
+
+            for product_id in range(1, options['changes'] + 1):
+                product = root.products[product_id]
+                product.set_rating(5.0)
+                index_product(root, product)
+            transaction.commit()
+            update_ms, updated = self.timed(lambda: snapshot.updated(root, catalog_version(root)), 1)
+            self.stdout.write(f"incremental refresh after {options['changes']} writes: {update_ms:.1f} ms ({len(updated.select())} live rows)")
+        finally:
+            transaction.abort()
+            connection.close()
+            db.close()
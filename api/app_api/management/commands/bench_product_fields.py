@@ -0,0 +1,54 @@
+import time
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from app_api.products.product_func import PRODUCT_LIST_FIELDS, PRODUCT_DETAIL_FIELDS
+from app_api.products.view import get_products, get_product_detail
+from zodb.zodb_management import get_read_connection
+
+PROJECTIONS = {
+    'full': None,
+    'no image': ','.join(field for field in PRODUCT_LIST_FIELDS if field != 'image'),
+    'id,name,price': 'id,name,digital_price,physical_price',
+}
+
+class Command(BaseCommand):
+    help = "Measure products/list/ and get_product_detail payload size and latency per fields= projection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=None, help="Page size for products/list/")
+
+    def timed(self, view, requests):
+        best = float('inf')
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = view()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000, len(response.content)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        requests = options['requests']
+        connection, root = get_read_connection()
+        try:
+            product_id = next(iter(root.products.keys()), None)
+        finally:
+            connection.close()
+
+        self.stdout.write("products/list/")
+        for name, fields in PROJECTIONS.items():
+            data = {}
+            if fields:
+                data['fields'] = fields
+            if options['limit']:
+                data['limit'] = options['limit']
+            ms, size = self.timed(lambda: get_products(factory.post('/products/list/', data)), requests)
+            self.stdout.write(f"{name:>16}: {size / 1024:10.1f} KiB {ms:9.2f} ms")
+
+        if product_id is None:
+            return
+        self.stdout.write(f"get_product_detail/{product_id}/")
+        for name, fields in {**PROJECTIONS, 'no image': ','.join(f for f in PRODUCT_DETAIL_FIELDS if f != 'image')}.items():
+            data = {'fields': fields} if fields else {}
+            ms, size = self.timed(lambda: get_product_detail(factory.get(f'/products/get_product_detail/{product_id}/', data), product_id), requests)
+            self.stdout.write(f"{name:>16}: {size / 1024:10.1f} KiB {ms:9.2f} ms")
@@ -0,0 +1,103 @@
+import random
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+import ZODB
+import transaction
+from zodb.zodb_management import _create_root_trees
+from app_api.products.objectModels import Item, Product
+from app_api.products.product_index import *
+
+CATEGORIES = ['chair', 'table', 'sofa', 'bed', 'lamp', 'shelf', 'cabinet', 'decor']
+
+# Full scan plus Python sort, as products/list/ did before the sorted indexes
+def scan_and_sort(root, sort_by, limit):
+    name, descending = SORT_MODES[sort_by]
+    rows = [(product_index_values(product)[name], product.id) for product in root.products.values()]
+    missing = float('-inf') if descending else float('inf')
+    rows.sort(key=lambda row: row[0] if row[0] is not None else missing, reverse=descending)
+    return [product_id for _, product_id in rows[:limit]]
+
+def indexed_top_k(root, sort_by, limit, candidate_ids=None):
+    ids = []
+    for product_id in iter_sorted_product_ids(root, sort_by, candidate_ids):
+        root.products[product_id].get_item().get_name()
+        ids.append(product_id)
+        if len(ids) >= limit:
+            break
+    return ids
+
+class Command(BaseCommand):
+    help = "Compare full-scan sorting with the sorted product indexes on a synthetic in-memory catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--limit', type=int, default=24)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def build(self, count):
+        db = ZODB.DB(None, cache_size=count * 3)
+        connection = db.open()
+        root = connection.root()
+        _create_root_trees(root)
+        rng = random.Random(0)
+        started = datetime(2024, 1, 1)
+        for product_id in range(1, count + 1):
+            item = Item(
+                id=product_id,
+                name=f"product {product_id}",
+                description="",
+                model_id=None,
+                image=None,
+                category=rng.choice(CATEGORIES),
+                type='furniture',
+                is_container=False,
+                created_at=started + timedelta(minutes=rng.randrange(500000)),
+            )
+            digital_price = round(rng.uniform(1, 500), 2) if rng.random() < 0.9 else None
+            product = Product(
+                id=product_id,
+                item=item,
+                digital_price=digital_price,
+                physical_price=round(rng.uniform(10, 5000), 2),
+                stock=10,
+                digital_available=digital_price is not None,
+                physical_available=True,
+                display_scenes=[],
+            )
+            product.set_rating(round(rng.uniform(0, 5), 2))
+            root.products[product_id] = product
+            index_product(root, product)
+            if product_id % 10000 == 0:
+                transaction.commit()
+        root.productIndexVersion = PRODUCT_INDEX_VERSION
+        transaction.commit()
+        return db, connection, root
+
+    def timed(self, fn, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000, result
+
+    def handle(self, *args, **options):
+        count, limit, repeat = options['products'], options['limit'], options['repeat']
+        started = time.perf_counter()
+        db, connection, root = self.build(count)
+        self.stdout.write(f"built {count} products in {time.perf_counter() - started:.1f}s, page size {limit}")
+        try:
+            for sort_by in SORT_MODES:
+                scan_ms, expected = self.timed(lambda: scan_and_sort(root, sort_by, limit), repeat)
+                index_ms, ids = self.timed(lambda: indexed_top_k(root, sort_by, limit), repeat)
+                same = [root.productIndexEntries[i][SORT_MODES[sort_by][0]] for i in ids] == \
+                    [root.productIndexEntries[i][SORT_MODES[sort_by][0]] for i in expected]
+                self.stdout.write(f"{sort_by:>28}: scan {scan_ms:8.2f} ms, index {index_ms:7.3f} ms, {scan_ms / index_ms:8.1f}x{'' if same else '  MISMATCH'}")
+            candidate_ids = candidate_product_ids(root, category=CATEGORIES[0])
+            index_ms, _ = self.timed(lambda: indexed_top_k(root, 'newest', limit, candidate_ids), repeat)
+            self.stdout.write(f"{'newest, one category':>28}: index {index_ms:7.3f} ms over {len(candidate_ids)} candidates")
+        finally:
+            transaction.abort()
+            connection.close()
+            db.close()
@@ -0,0 +1,60 @@
+import threading
+import time
+from django.core.management.base import BaseCommand
+from zodb.zodb_management import db, get_connection, get_read_connection
+import transaction
+
+# Same object traversal as products/list/ without the HTTP layer
+def list_products(root):
+    rows = []
+    for product in root.products.values():
+        item = product.get_item()
+        rows.append((product.id, item.get_name(), item.get_category(), product.get_digital_price(), product.get_physical_price(), product.get_rating()))
+    return rows
+
+def read_write_request():
+    connection, root = get_connection()
+    try:
+        return list_products(root)
+    finally:
+        transaction.abort()
+        connection.close()
+
+def read_only_request():
+    connection, root = get_read_connection()
+    try:
+        return list_products(root)
+    finally:
+        connection.close()
+
+class Command(BaseCommand):
+    help = "Measure products/list/ throughput with read-write vs read-only connections under concurrent readers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200, help="Requests per thread")
+
+    def run(self, request_fn, threads, requests):
+        def worker():
+            for _ in range(requests):
+                request_fn()
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        threads, requests = options['threads'], options['requests']
+        total = threads * requests
+        self.stdout.write(f"{len(read_only_request())} products, {threads} threads x {requests} requests")
+        results = {}
+        for name, request_fn in (('read-write', read_write_request), ('read-only', read_only_request)):
+            request_fn()
+            elapsed = self.run(request_fn, threads, requests)
+            results[name] = total / elapsed
+            self.stdout.write(f"{name:>10}: {results[name]:8.1f} req/s ({elapsed:.2f}s)")
+        self.stdout.write(f"speedup: {results['read-only'] / results['read-write']:.2f}x")
+        self.stdout.write(f"pool size {db.getPoolSize()}, cache size {db.getCacheSize()}")
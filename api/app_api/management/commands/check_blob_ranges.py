@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from zodb.blob_serving import parse_range
+
+# (Range header, blob size, expected parse_range result): None serves the
+# whole file, () answers 416, (start, end) answers 206.
+RANGE_CASES = [
+    ('bytes=0-99', 1000, (0, 99)),
+    ('bytes=900-', 1000, (900, 999)),
+    ('bytes=-100', 1000, (900, 999)),
+    ('bytes=-5000', 1000, (0, 999)),
+    ('bytes=500-5000', 1000, (500, 999)),
+    ('bytes=1000-', 1000, ()),
+    ('bytes=-0', 1000, ()),
+    ('bytes=5-2', 1000, ()),
+    ('bytes=0-', 0, ()),
+    ('bytes=-100', 0, ()),
+    ('bytes=0-0', 0, ()),
+    ('bytes=0-1,5-9', 1000, None),
+    ('items=0-9', 1000, None),
+    ('bytes=-', 1000, None),
+]
+
+class Command(BaseCommand):
+    help = "Check Range header parsing for blob downloads against the expected responses"
+
+    def handle(self, *args, **options):
+        failures = []
+        for header, size, expected in RANGE_CASES:
+            result = parse_range(header, size)
+            if result != expected:
+                failures.append(f"{header!r} on {size} bytes: {result!r}, expected {expected!r}")
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write(self.style.SUCCESS(f"{len(RANGE_CASES)} range cases passed"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from app_api.products.asset_store import migrate_assets_to_store
+
+class Command(BaseCommand):
+    help = "Move model, scene, texture and home blobs into the content-addressed asset store"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        migrated = migrate_assets_to_store(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{migrated} assets moved to the asset store"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from zodb.zodb_management import ASSET_KEY_PREFIXES, migrate_asset_tree
+
+class Command(BaseCommand):
+    help = "Move objectModels, textures and displayScenes to integer-keyed IOBTrees while the API keeps running"
+
+    def handle(self, *args, **options):
+        for name in ASSET_KEY_PREFIXES:
+            migrated = migrate_asset_tree(name)
+            if migrated:
+                self.stdout.write(f"{name}: {migrated} entries moved to IOBTree")
+            else:
+                self.stdout.write(f"{name}: already integer-keyed")
+        self.stdout.write(self.style.SUCCESS("Asset trees migrated"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from app_api.products.product_func import migrate_product_images
+
+class Command(BaseCommand):
+    help = "Move inline base64 product images into blobs and generate their thumbnails"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        migrated = migrate_product_images(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{migrated} product images moved to blobs"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from app_api.products.product_func import migrate_textures_to_blobs
+
+class Command(BaseCommand):
+    help = "Move base64 texture payloads into ZODB blobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        migrated = migrate_textures_to_blobs(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{migrated} textures moved to blobs"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    help = "Copy every transaction and blob from the local zodb.fs into the RelStorage database"
+    # System checks import zodb_management, which would open the configured storage
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help="Wipe the RelStorage tables before copying")
+
+    def handle(self, *args, **options):
+        from zodb.storages import open_file_storage, open_relstorage
+
+        source = open_file_storage(read_only=True)
+        destination = open_relstorage()
+        try:
+            if options['clear']:
+                destination.zap_all()
+            elif destination.lastTransaction() != b'\0' * 8:
+                raise CommandError("RelStorage database is not empty; rerun with --clear to overwrite it")
+            self.stdout.write(f"Copying {len(source)} objects from FileStorage to RelStorage...")
+            destination.copyTransactionsFrom(source)
+        finally:
+            destination.close()
+            source.close()
+        self.stdout.write(self.style.SUCCESS("ZODB copied to RelStorage"))
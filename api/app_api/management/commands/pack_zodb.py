@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from zodb.zodb_management import pack_zodb
+
+def _format_bytes(size):
+    if size is None:
+        return "n/a"
+    return f"{size / (1024 * 1024):.2f} MB"
+
+class Command(BaseCommand):
+    help = "Pack ZODB to the retention window and remove unreferenced blobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=None, help="History to keep (defaults to ZODB_PACK_DAYS)")
+
+    def handle(self, *args, **options):
+        stats = pack_zodb(options['days'])
+        before, after = stats['before'], stats['after']
+        self.stdout.write(f"retention: {stats['retention_days']} days")
+        self.stdout.write(f"duration: {stats['duration_seconds']:.3f}s")
+        self.stdout.write(f"zodb.fs: {_format_bytes(before['file_bytes'])} -> {_format_bytes(after['file_bytes'])}")
+        self.stdout.write(f"blobs: {_format_bytes(before['blob_bytes'])} -> {_format_bytes(after['blob_bytes'])}")
+        self.stdout.write(f"storage: {_format_bytes(before['storage_bytes'])} -> {_format_bytes(after['storage_bytes'])}")
+        self.stdout.write(self.style.SUCCESS(f"Reclaimed {_format_bytes(stats['reclaimed_bytes'])}"))
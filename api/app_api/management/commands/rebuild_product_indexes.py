@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from app_api.products.product_index import rebuild_product_indexes
+
+class Command(BaseCommand):
+    help = "Rebuild the filter and sort indexes used by products/list"
+
+    def handle(self, *args, **options):
+        indexed = rebuild_product_indexes()
+        self.stdout.write(self.style.SUCCESS(f"{indexed} products indexed"))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from app_api.products.product_func import recount_product_images
+
+class Command(BaseCommand):
+    help = "Recount product image references from the items using them and drop unused images"
+
+    def handle(self, *args, **options):
+        used, removed = recount_product_images()
+        self.stdout.write(self.style.SUCCESS(f"{used} product images in use, {removed} unused images removed"))
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = "Run a ZEO server over the local zodb.fs and blob directory so several API workers can share it"
+    # System checks import the URLconf and with it zodb_management, which would
+    # open (and lock) zodb.fs before the server gets to it.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--address', default=None, help="host:port or unix socket path (defaults to ZODB_ZEO_ADDRESS)")
+
+    def handle(self, *args, **options):
+        import ZEO.runzeo
+        from zodb.storages import write_zeo_server_config
+
+        address = options['address'] or getattr(settings, "ZODB_ZEO_ADDRESS", "127.0.0.1:8100")
+        conf_file = write_zeo_server_config(address)
+        self.stdout.write(f"Starting ZEO server on {address} ({conf_file})")
+        ZEO.runzeo.main(['-C', conf_file])
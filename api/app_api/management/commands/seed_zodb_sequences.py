@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from zodb.zodb_management import seed_sequences
+
+class Command(BaseCommand):
+    help = "Seed the persistent ZODB ID sequences from the keys already stored in each tree"
+
+    def handle(self, *args, **options):
+        seeded = seed_sequences()
+        for name, value in seeded.items():
+            self.stdout.write(f"{name}: next id {value + 1}")
+        self.stdout.write(self.style.SUCCESS("ZODB sequences seeded"))
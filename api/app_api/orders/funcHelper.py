@@ -3,22 +3,10 @@ from django.db import connection
 from zodb.zodb_management import *
 
 def get_container_owned_item_id(root):
-    if not root.containerOwnedItems:
-        return 1
-    existing_ids = [
-        int(key)
-        for key in root.containerOwnedItems.keys() if key.isdigit()
-    ]
-    return max(existing_ids) + 1
+    return next_id("containerOwnedItems")
 
 def get_noncontainer_owned_item_id(root):
-    if not root.nonContainerOwnedItems:
-        return 1
-    existing_ids = [
-        int(key)
-        for key in root.nonContainerOwnedItems.keys() if key.isdigit()
-    ]
-    return max(existing_ids) + 1
+    return next_id("nonContainerOwnedItems")
 
 def create_spatial_instance():
     with connection.cursor() as cursor:
@@ -6,6 +6,7 @@ from .models import Order, OrderItem, PaymentMethod
 from app_api.products.objectModels import ContainerOwnedItem, NonContainerOwnedItem
 from app_api.users.models import CreditCard, BankAccount
 from zodb.zodb_management import *
+from app_api.products.product_func import retain_product_image
 from app_api.orders.funcHelper import *
 from datetime import datetime
 import transaction
@@ -84,7 +85,7 @@ def checkout(request):
 @login_required
 @require_http_methods(["GET"])
 def list_orders(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
         if not customer:
@@ -156,7 +157,6 @@ def list_orders(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
 
 
 @csrf_exempt
@@ -195,7 +195,7 @@ def cancel_order(request, order_id):
 @login_required
 @require_http_methods(["POST"])
 def complete_order(request, order_id):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
         if not customer:
@@ -235,6 +235,8 @@ def complete_order(request, order_id):
                             created_at=current_time,
                             wall_mountable=item.is_wall_mountable()
                         )
+                        categorizedItem.set_image_id(item.get_image_id())
+                        retain_product_image(root, item.get_image_id())
                         root.containerOwnedItems[str(container_id)] = categorizedItem
                     else:
                         noncontainer_id = get_noncontainer_owned_item_id(root)
@@ -254,6 +256,8 @@ def complete_order(request, order_id):
                             created_at=current_time,
                             wall_mountable=item.wall_mountable
                         )
+                        categorizedItem.set_image_id(item.get_image_id())
+                        retain_product_image(root, item.get_image_id())
                         root.nonContainerOwnedItems[str(noncontainer_id)] = categorizedItem
                     transaction.commit()
                     customer.owned_digital_products.append({ 'id': categorizedItem.get_id(), 'is_container': categorizedItem.is_container})
@@ -264,4 +268,3 @@ def complete_order(request, order_id):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
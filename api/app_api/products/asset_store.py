@@ -0,0 +1,154 @@
+import hashlib
+import os
+import persistent
+import transaction
+from BTrees.Length import Length
+from ZODB.blob import Blob
+from zodb.zodb_management import *
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Uploads larger than FILE_UPLOAD_MAX_MEMORY_SIZE arrive as temporary files;
+# those are moved into blob storage (a rename on the same filesystem, a
+# chunked copy otherwise). The open upload handle stays readable afterwards,
+# except on Windows, where an open file cannot be moved and it is copied.
+# Everything else is copied in fixed-size chunks, so an upload is never held
+# in memory whole.
+def write_upload_blob(upload):
+    blob = Blob()
+    if hasattr(upload, 'temporary_file_path') and os.name != 'nt':
+        upload.file.flush()
+        blob.consumeFile(upload.temporary_file_path())
+        return blob
+    with blob.open('w') as f:
+        for chunk in _upload_chunks(upload):
+            f.write(chunk)
+    return blob
+
+def _upload_chunks(upload):
+    if hasattr(upload, 'chunks'):
+        chunks = upload.chunks(UPLOAD_CHUNK_SIZE)
+    else:
+        chunks = iter(lambda: upload.read(UPLOAD_CHUNK_SIZE) or b'', b'')
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('latin-1')
+        yield chunk
+
+def _file_chunks(handle):
+    return iter(lambda: handle.read(UPLOAD_CHUNK_SIZE), b'')
+
+# Content-addressed store for model, scene and texture files: root.assetBlobs
+# maps the SHA-256 hex digest of the bytes to one AssetBlob shared by every
+# Model3D, DisplayScene, Texture and Home3D holding them. refs is a Length so
+# concurrent acquires of an existing asset merge instead of conflicting; the
+# entry is dropped with the last reference and pack removes the blob file.
+#
+# Dropping an entry is guarded with readCurrent in both directions: acquires
+# read the AssetBlob current and the drop writes it, while the drop reads refs
+# current without writing it and every acquire writes refs. Either way one
+# of the two transactions gets a ConflictError instead of an acquire
+# committing against a deleted entry. Concurrent acquires, and releases that
+# leave references, still merge.
+class AssetBlob(persistent.Persistent):
+    def __init__(self, digest, blob, size):
+        self.digest = digest
+        self.blob = blob
+        self.size = size
+        self.refs = Length()
+
+    def get_digest(self):
+        return self.digest
+
+    def get_blob(self):
+        return self.blob
+
+    def get_size(self):
+        return self.size
+
+    def get_refs(self):
+        return self.refs()
+
+def _digest(chunks):
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in chunks:
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+def upload_digest(upload):
+    if hasattr(upload, 'temporary_file_path'):
+        upload.file.flush()
+        with open(upload.temporary_file_path(), 'rb') as handle:
+            return _digest(_file_chunks(handle))
+    return _digest(_upload_chunks(upload))
+
+def blob_digest(blob):
+    with blob.open('r') as handle:
+        return _digest(_file_chunks(handle))
+
+def _read_current(obj):
+    if obj._p_jar is not None and obj._p_oid is not None:
+        obj._p_activate()
+        obj._p_jar.readCurrent(obj)
+
+def _acquire(root, digest, size, make_blob):
+    asset = root.assetBlobs.get(digest)
+    if asset is None:
+        asset = AssetBlob(digest, make_blob(), size)
+        root.assetBlobs[digest] = asset
+    else:
+        _read_current(asset)
+    asset.refs.change(1)
+    return asset
+
+# Returns the AssetBlob for the upload's bytes, storing them only if new
+def acquire_asset(root, upload):
+    digest, size = upload_digest(upload)
+    return _acquire(root, digest, size, lambda: write_upload_blob(upload))
+
+def release_asset(root, digest):
+    if digest is None:
+        return
+    asset = root.assetBlobs.get(digest)
+    if asset is None:
+        return
+    if asset.refs() > 1:
+        asset.refs.change(-1)
+        return
+    # Last reference: refs is left unwritten so readCurrent can see an
+    # acquire committed meanwhile, and the asset is written so an acquire
+    # committing later conflicts
+    _read_current(asset.refs)
+    asset._p_changed = True
+    del root.assetBlobs[digest]
+
+ASSET_TREES = ("objectModels", "displayScenes", "textures", "homeObjectModels")
+
+# Moves assets stored before the asset store into it, sharing one blob per
+# distinct content, committing every batch_size assets. Textures still holding
+# base64 text are left for migrate_texture_blobs.
+def migrate_assets_to_store(batch_size=100):
+    connection, root = get_connection()
+    try:
+        migrated = 0
+        for name in ASSET_TREES:
+            for asset in list(getattr(root, name).values()):
+                blob = asset.get_file()
+                if asset.get_digest() is not None or not isinstance(blob, Blob):
+                    continue
+                digest, size = blob_digest(blob)
+                stored = _acquire(root, digest, size, lambda: blob)
+                asset.file = stored.get_blob()
+                asset.digest = digest
+                migrated += 1
+                if migrated % batch_size == 0:
+                    transaction.commit()
+        transaction.commit()
+        return migrated
+    except Exception:
+        transaction.abort()
+        raise
+    finally:
+        connection.close()
@@ -0,0 +1,85 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from django.http import HttpResponse, HttpResponseNotModified
+from ZODB.utils import u64
+from zodb.zodb_management import *
+
+# Conditional GET and a per-process response cache for the catalog endpoints.
+# Both are keyed on the id of the last transaction that wrote a product (the
+# _p_serial of root.catalogVersion), so any catalog commit changes every ETag
+# and drops the cached responses, while unrelated commits leave them alone.
+CATALOG_CACHE_SIZE = 200
+
+_responses = OrderedDict()
+_responses_version = None
+_responses_lock = threading.Lock()
+cache_stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+# Read through the request's read connection, which the view then uses, so
+# the ETag always describes the state the response is built from
+def catalog_serial(root):
+    version = getattr(root, 'catalogVersion', None)
+    if version is None:
+        return u64(db.lastTransaction())
+    version._p_activate()
+    return u64(version._p_serial)
+
+def _request_key(request, args, kwargs):
+    params = request.POST if request.method == 'POST' else request.GET
+    digest = hashlib.sha1()
+    digest.update(f"{request.path}|{args}|{sorted(kwargs.items())}".encode())
+    for key in sorted(params):
+        digest.update(f"|{key}={params.getlist(key)}".encode())
+    return digest.hexdigest()[:16]
+
+def _etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return header.strip() == '*' or etag in [tag.strip() for tag in header.split(',')]
+
+def _cached(key, version):
+    global _responses_version
+    with _responses_lock:
+        if _responses_version != version:
+            _responses.clear()
+            _responses_version = version
+            return None
+        entry = _responses.get(key)
+        if entry is not None:
+            _responses.move_to_end(key)
+        return entry
+
+def _store(key, version, entry):
+    with _responses_lock:
+        if _responses_version != version:
+            return
+        _responses[key] = entry
+        while len(_responses) > CATALOG_CACHE_SIZE:
+            _responses.popitem(last=False)
+
+def catalog_cached(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        version = catalog_serial(request.zodb_read.root)
+        key = _request_key(request, args, kwargs)
+        etag = f'"{version:016x}-{key}"'
+        if request.method in ('GET', 'HEAD') and _etag_matches(request, etag):
+            cache_stats['not_modified'] += 1
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+        entry = _cached(key, version)
+        if entry is not None:
+            cache_stats['hits'] += 1
+            response = HttpResponse(entry['content'], status=200, content_type=entry['content_type'])
+        else:
+            cache_stats['misses'] += 1
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            _store(key, version, {'content': response.content, 'content_type': response['Content-Type']})
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
@@ -0,0 +1,184 @@
+import threading
+import numpy as np
+from .product_index import *
+from .product_index import _comes_after
+
+# Per-process columnar copy of the catalog, built from the stored index entries
+# (no Product is loaded) and keyed on the catalog version. Moving to a newer
+# version re-reads only the products the index change journal lists after the
+# snapshot's version. A full rebuild happens on first use, when the journal no
+# longer reaches back to the snapshot, or when too many rows are dead.
+#
+# Snapshots share one CatalogColumns store. A changed product's old row gets
+# the version it died at and its new values are appended, so a snapshot keeps
+# seeing exactly the rows alive at its own version while newer ones are added
+# behind it, and no column is copied on refresh.
+COMPACT_DEAD_RATIO = 0.25
+INITIAL_CAPACITY = 1024
+LIVE = np.iinfo(np.int64).max
+
+COLUMNS = {
+    'ids': np.int64,
+    'digital_price': np.float64,
+    'physical_price': np.float64,
+    'rating': np.float64,
+    'created_at': np.float64,
+    'category': np.int32,
+    'type': np.int32,
+    'digital': np.bool_,
+    'physical': np.bool_,
+    'died': np.int64,
+}
+
+def _nan(value):
+    return np.nan if value is None else value
+
+class CatalogColumns:
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.size = 0
+        self.dead = 0
+        self.rows = {}
+        self.codes = {'category': {}, 'type': {}}
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.empty(capacity, dtype=dtype))
+
+    def _code(self, column, value):
+        codes = self.codes[column]
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+
+    def row(self, product_id, values):
+        formats = values.get('format', ())
+        return (
+            product_id,
+            _nan(values.get('digital_price')),
+            _nan(values.get('physical_price')),
+            _nan(values.get('rating')),
+            _nan(values.get('created_at')),
+            self._code('category', (values.get('category') or ('',))[0]),
+            self._code('type', (values.get('type') or ('',))[0]),
+            'digital' in formats,
+            'physical' in formats,
+            LIVE,
+        )
+
+    # Grows by doubling; arrays held by existing snapshots are left as they are
+    def append(self, rows):
+        if not rows:
+            return
+        end = self.size + len(rows)
+        if end > len(self.ids):
+            capacity = max(end, 2 * len(self.ids))
+            for name, dtype in COLUMNS.items():
+                column = np.empty(capacity, dtype=dtype)
+                column[:self.size] = getattr(self, name)[:self.size]
+                setattr(self, name, column)
+        for (name, dtype), column in zip(COLUMNS.items(), zip(*rows)):
+            getattr(self, name)[self.size:end] = np.array(column, dtype=dtype)
+        for offset, row in enumerate(rows):
+            self.rows[row[0]] = self.size + offset
+        self.size = end
+
+    def kill(self, product_id, version):
+        position = self.rows.pop(product_id, None)
+        if position is not None:
+            self.died[position] = version
+            self.dead += 1
+
+class CatalogSnapshot:
+    def __init__(self, columns, version):
+        self.columns = columns
+        self.version = version
+        self.codes = columns.codes
+        for name in COLUMNS:
+            setattr(self, name, getattr(columns, name)[:columns.size])
+
+    @classmethod
+    def build(cls, root, version):
+        entries = root.productIndexEntries
+        columns = CatalogColumns(max(len(entries), INITIAL_CAPACITY))
+        columns.append([columns.row(product_id, values) for product_id, values in entries.items()])
+        return cls(columns, version)
+
+    # Only valid on the latest snapshot of its store. Returns a new snapshot;
+    # this one stays valid for threads using it.
+    def updated(self, root, version):
+        changed = changed_product_ids(root, self.version)
+        if changed is None:
+            return CatalogSnapshot.build(root, version)
+        columns = self.columns
+        entries = root.productIndexEntries
+        appended = []
+        for product_id in changed:
+            columns.kill(product_id, version)
+            values = entries.get(product_id)
+            if values is not None:
+                appended.append(columns.row(product_id, values))
+        columns.append(appended)
+        if columns.dead > COMPACT_DEAD_RATIO * columns.size:
+            return CatalogSnapshot.build(root, version)
+        return CatalogSnapshot(columns, version)
+
+    def select(self, category=None, product_type=None, format=None, min_price=None, max_price=None, candidate_ids=None):
+        mask = self.died > self.version
+        if category is not None:
+            code = self.codes['category'].get(category.lower())
+            mask &= self.category == code if code is not None else False
+        if product_type is not None:
+            code = self.codes['type'].get(product_type.lower())
+            mask &= self.type == code if code is not None else False
+        if format is not None and format.lower() == 'digital':
+            mask &= self.digital
+        if format is not None and format.lower() == 'physical':
+            mask &= self.physical
+        # Same rule as the products/list/ loop: a product is out only when
+        # both of its prices are known and both are outside the range.
+        if min_price is not None:
+            mask &= ~((self.digital_price < min_price) & (self.physical_price < min_price))
+        if max_price is not None:
+            mask &= ~((self.digital_price > max_price) & (self.physical_price > max_price))
+        if candidate_ids is not None:
+            mask &= np.isin(self.ids, np.fromiter(candidate_ids, dtype=np.int64))
+        return np.flatnonzero(mask)
+
+    # Sort keys in the same (missing, value, product_id) form and order as the
+    # sorted BTree indexes, so cursors work the same on either path.
+    def ordered_keys(self, rows, sort_by, after=None):
+        name, descending = SORT_MODES[sort_by]
+        values = getattr(self, name)[rows]
+        ids = self.ids[rows]
+        missing = np.isnan(values)
+        values = np.where(missing, 0.0, values)
+        if descending:
+            order = np.lexsort((np.where(missing, ids, -ids), -values, missing))
+        else:
+            order = np.lexsort((ids, values, missing))
+        keys = [(int(m), float(v), int(i)) for m, v, i in zip(missing[order], values[order], ids[order])]
+        if after is not None:
+            keys = [key for key in keys if _comes_after(key, after, descending)]
+        return keys
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+# Snapshot matching the connection's view, or None when it cannot be used
+# (indexes not built, or the connection is older than the cached snapshot).
+def get_catalog_snapshot(root):
+    global _snapshot
+    if not product_indexes_ready(root):
+        return None
+    version = catalog_version(root)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _snapshot_lock:
+        snapshot = _snapshot
+        if snapshot is not None and snapshot.version >= version:
+            return snapshot if snapshot.version == version else None
+        if snapshot is None:
+            snapshot = CatalogSnapshot.build(root, version)
+        else:
+            snapshot = snapshot.updated(root, version)
+        _snapshot = snapshot
+        return snapshot
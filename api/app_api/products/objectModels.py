@@ -1,11 +1,20 @@
+import base64
+import io
 import persistent
+from BTrees.Length import Length
+from ZODB.blob import Blob
 
+# file is shared through the asset store and digest is its SHA-256 key there;
+# assets saved before the store existed have digest None until migrated
 class Model3D(persistent.Persistent):
-    def __init__(self, model_id, file, filename, textures=None):
+    digest = None
+
+    def __init__(self, model_id, file, filename, textures=None, digest=None):
         self.model_id = model_id
         self.file = file
         self.filename = filename
         self.textures = textures if textures else []
+        self.digest = digest
         
     def get_model_id(self):
         return self.model_id
@@ -19,11 +28,17 @@ class Model3D(persistent.Persistent):
     def get_textures(self):
         return self.textures
 
+    def get_digest(self):
+        return self.digest
+
 class Texture(persistent.Persistent):
-    def __init__(self, texture_id, filename, file):
+    digest = None
+
+    def __init__(self, texture_id, filename, file, digest=None):
         self.texture_id = texture_id
         self.filename = filename
         self.file = file
+        self.digest = digest
         
     def get_filename(self):
         return self.filename
@@ -33,12 +48,24 @@ class Texture(persistent.Persistent):
     
     def get_file(self):
         return self.file
+
+    def get_digest(self):
+        return self.digest
+
+    # Binary file handle; textures saved before the blob migration hold base64 text
+    def open_file(self):
+        if isinstance(self.file, Blob):
+            return self.file.open('r')
+        return io.BytesIO(base64.b64decode(self.file))
     
 class DisplayScene(persistent.Persistent):
-    def __init__(self, scene_id, file, filename):
+    digest = None
+
+    def __init__(self, scene_id, file, filename, digest=None):
         self.scene_id = scene_id
         self.file = file
         self.filename = filename
+        self.digest = digest
         
     def get_scene_id(self):
         return self.scene_id
@@ -48,14 +75,60 @@ class DisplayScene(persistent.Persistent):
     
     def get_filename(self):
         return self.filename
-    
+
+    def get_digest(self):
+        return self.digest
+    
+# Shared by a product's Item and every owned item copied from it; refs counts
+# those items. Images stored before reference counting have refs None until
+# `manage.py recount_product_images` runs.
+class ProductImage(persistent.Persistent):
+    refs = None
+
+    def __init__(self, image_id, filename, content_type, original, thumbnails, thumbnail_type):
+        self.image_id = image_id
+        self.filename = filename
+        self.content_type = content_type
+        self.original = original
+        self.thumbnails = thumbnails
+        self.thumbnail_type = thumbnail_type
+        self.refs = Length(1)
+
+    def get_image_id(self):
+        return self.image_id
+
+    def get_filename(self):
+        return self.filename
+
+    def get_content_type(self):
+        return self.content_type
+
+    def get_original(self):
+        return self.original
+
+    def get_thumbnail(self, size):
+        return self.thumbnails.get(size)
+
+    def get_thumbnail_type(self):
+        return self.thumbnail_type
+
+    # Returns (binary handle, content type) for a thumbnail size or 'original'
+    def open_size(self, size):
+        if size == 'original':
+            return self.original.open('r'), self.content_type
+        return self.thumbnails[size].open('r'), self.thumbnail_type
+
 class Item(persistent.Persistent):
-    def __init__(self, id, name, description, image, model_id, category, type, is_container, created_at, wall_mountable=False):
+    # Items saved before product images moved to blobs have no image_id
+    image_id = None
+
+    def __init__(self, id, name, description, image, model_id, category, type, is_container, created_at, wall_mountable=False, image_id=None):
         self.id = id
         self.name = name
         self.description = description
         self.model_id = model_id
         self.image = image
+        self.image_id = image_id
         self.category = category
         self.type = type
         self.is_container = is_container
@@ -77,6 +150,12 @@ class Item(persistent.Persistent):
 
     def set_image(self, image):
         self.image = image
+
+    def get_image_id(self):
+        return self.image_id
+
+    def set_image_id(self, image_id):
+        self.image_id = image_id
     
     def get_model_id(self):
         return self.model_id
@@ -0,0 +1,88 @@
+from BTrees.IIBTree import IITreeSet, difference, intersection, multiunion
+from .product_index import *
+
+# Facet counts for the shop filters, computed from the maintained index sets
+# without loading any Product. Each facet is counted against every filter
+# except its own, so the counts show what picking another value would return.
+def _narrow(ids, other):
+    if other is None:
+        return ids
+    if ids is None:
+        return other
+    return intersection(ids, other)
+
+def _count(ids, facet_ids):
+    if facet_ids is None:
+        return 0
+    return len(facet_ids) if ids is None else len(intersection(ids, facet_ids))
+
+def _priced_ids(root, name, low, high):
+    return IITreeSet(key[2] for key in root.productIndexes[name].keys(low, high, excludemax=True))
+
+# Same rule as the products/list/ loop and the catalog snapshot: a product is
+# out only when both of its prices are known and both are below min_price, or
+# both are above max_price. Products without a known price always stay.
+def price_range_ids(root, min_price=None, max_price=None):
+    if min_price is None and max_price is None:
+        return None
+    excluded = []
+    if min_price is not None:
+        low, high = (0, float('-inf')), (0, float(min_price))
+        excluded.append(intersection(_priced_ids(root, 'digital_price', low, high), _priced_ids(root, 'physical_price', low, high)))
+    if max_price is not None:
+        low, high = (0, float(max_price), float('inf')), (1,)
+        excluded.append(intersection(_priced_ids(root, 'digital_price', low, high), _priced_ids(root, 'physical_price', low, high)))
+    return difference(IITreeSet(root.productIndexEntries.keys()), multiunion(excluded))
+
+def product_facets(root, category=None, product_type=None, format=None, search_query=None, min_price=None, max_price=None):
+    indexes = root.productIndexes
+    base = None
+    if search_query:
+        base = IITreeSet(search_products(root, search_query))
+    priced = _narrow(base, price_range_ids(root, min_price, max_price))
+    filters = {'category': category, 'product_type': product_type, 'format': format}
+
+    def without(name):
+        return _narrow(candidate_product_ids(root, **dict(filters, **{name: None})), priced)
+
+    matching = _narrow(candidate_product_ids(root, **filters), priced)
+    total = product_count(root) if matching is None else len(matching)
+
+    category_ids = without('category')
+    categories = {}
+    for name in registered_categories(root):
+        key = name.lower()
+        if key not in categories:
+            categories[key] = {'value': name, 'count': _count(category_ids, indexes['category'].get(key))}
+
+    type_ids = without('product_type')
+    types = {}
+    for name in registered_product_types(root):
+        key = name.lower()
+        if key not in types:
+            types[key] = {'value': name, 'count': _count(type_ids, indexes['type'].get(key))}
+
+    format_ids = without('format')
+    formats = {value: _count(format_ids, indexes['format'].get(value)) for value in ('digital', 'physical')}
+
+    # Histograms ignore the price filter itself, like the other facets
+    histogram_ids = _narrow(candidate_product_ids(root, **filters), base)
+    histograms = {}
+    for name in ('digital_price', 'physical_price'):
+        buckets = indexes[f'{name}_bucket']
+        histograms[name] = [
+            {
+                'min': low,
+                'max': PRICE_BUCKETS[position + 1] if position + 1 < len(PRICE_BUCKETS) else None,
+                'count': _count(histogram_ids, buckets.get(low)),
+            }
+            for position, low in enumerate(PRICE_BUCKETS)
+        ]
+
+    return {
+        'total': total,
+        'categories': [facet for facet in categories.values() if facet['count']],
+        'types': [facet for facet in types.values() if facet['count']],
+        'formats': formats,
+        'price_histograms': histograms,
+    }
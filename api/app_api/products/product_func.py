@@ -1,36 +1,211 @@
 from datetime import datetime
 from .objectModels import *
+from .product_index import *
+from .asset_store import *
 from zodb.zodb_management import *
 import transaction
 from ZODB.blob import Blob
+from django.http import HttpResponse
+from zodb.blob_serving import asset_version, blob_response
 import base64
+import mimetypes
+import os
 
 def get_item_id(root):
-    if not root.objectItems:
-        return 1
-    existing_ids = [
-        int(key)
-        for key in root.objectItems.keys()
-    ]
-    return max(existing_ids) + 1
+    return next_id("objectItems")
 
 def get_product_id(root):
-    if not root.products:
-        return 1
-    existing_ids = [
-        int(key)
-        for key in root.products.keys()
-    ]
-    return max(existing_ids) + 1
-
-def create_product(name, description, digital_price, physical_price, category, image, product_type, stock, model_files, scene_files, digital_available, physical_available, is_container, texture_files=None, wall_mountable=False):
+    return next_id("products")
+
+PRODUCT_IMAGE_SIZES = {'small': 160, 'medium': 480, 'large': 1024}
+
+def _thumbnail_blob(image, max_side, image_format):
+    thumbnail = image.copy()
+    thumbnail.thumbnail((max_side, max_side))
+    blob = Blob()
+    with blob.open('w') as f:
+        if image_format == 'JPEG':
+            thumbnail.save(f, format='JPEG', quality=85, optimize=True)
+        else:
+            thumbnail.save(f, format='PNG', optimize=True)
+    return blob
+
+# Stores the upload as a blob and renders every thumbnail size once, at upload time
+def create_product_image(root, image_file):
+    from PIL import Image, UnidentifiedImageError
+    try:
+        image_file.seek(0)
+        image = Image.open(image_file)
+        image.load()
+    except (UnidentifiedImageError, OSError):
+        raise ValueError("Invalid image file")
+    content_type = Image.MIME.get(image.format, 'application/octet-stream')
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    image_format = 'PNG' if has_alpha else 'JPEG'
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    image_id = next_id("productImages")
+    image_file.seek(0)
+    root.productImages[image_id] = ProductImage(
+        image_id=image_id,
+        filename=getattr(image_file, 'name', f'image_{image_id}'),
+        content_type=content_type,
+        original=write_upload_blob(image_file),
+        thumbnails={size: _thumbnail_blob(image, max_side, image_format) for size, max_side in PRODUCT_IMAGE_SIZES.items()},
+        thumbnail_type=f'image/{image_format.lower()}',
+    )
+    return image_id
+
+# Called for every other item that starts sharing the image
+def retain_product_image(root, image_id):
+    image = root.productImages.get(image_id) if image_id is not None else None
+    if image is not None and image.refs is not None:
+        image.refs.change(1)
+
+# Drops the image with its last item; pack then removes its blobs
+def release_product_image(root, image_id):
+    image = root.productImages.get(image_id) if image_id is not None else None
+    if image is None or image.refs is None:
+        return
+    image.refs.change(-1)
+    if image.refs() <= 0:
+        del root.productImages[image_id]
+
+PRODUCT_IMAGE_OWNERS = ("objectItems", "containerOwnedItems", "nonContainerOwnedItems")
+
+# Sets every image's reference count from the items that use it and removes
+# images no item uses any more
+def recount_product_images():
+    connection, root = get_connection()
+    try:
+        counts = {}
+        for name in PRODUCT_IMAGE_OWNERS:
+            for item in getattr(root, name).values():
+                image_id = item.get_image_id()
+                if image_id is not None:
+                    counts[image_id] = counts.get(image_id, 0) + 1
+        removed = 0
+        for image_id, image in list(root.productImages.items()):
+            count = counts.get(image_id, 0)
+            if count == 0:
+                del root.productImages[image_id]
+                removed += 1
+            elif image.refs is None:
+                image.refs = Length(count)
+            elif image.refs() != count:
+                image.refs.set(count)
+        transaction.commit()
+        return len(counts), removed
+    except Exception:
+        transaction.abort()
+        raise
+    finally:
+        connection.close()
+
+def product_image_urls(item):
+    image_id = item.get_image_id()
+    if image_id is None:
+        return None
+    return {size: f"/products/image/{image_id}/{size}/" for size in (*PRODUCT_IMAGE_SIZES, 'original')}
+
+# Image fields for API responses: thumbnail URLs, plus the inline base64 image
+# only for items that still carry one (not yet migrated, or a client override)
+def image_fields(item):
+    fields = {'image_urls': product_image_urls(item)}
+    if item.get_image():
+        fields['image'] = item.get_image()
+    return fields
+
+# Download URL carrying the file's content version, which blob_response
+# serves as immutable; None when the asset has no file
+def asset_download_url(root, name, asset_id, path):
+    asset = get_asset(root, name, asset_id) if asset_id is not None else None
+    if asset is None or asset.get_file() is None:
+        return None
+    return f"{path}{asset_id}/?v={asset_version(asset.get_file(), asset.get_digest())}"
+
+def model_url(product):
+    root = product._p_jar.root()
+    return asset_download_url(root, "objectModels", product.get_item().get_model_id(), "/products/get_3d_model/")
+
+def display_scene_urls(product):
+    root = product._p_jar.root()
+    return [asset_download_url(root, "displayScenes", scene_id, "/products/get_display_scene/") for scene_id in product.get_display_scenes()]
+
+# Response fields for products/list/ and get_product_detail. Each getter only
+# touches what it needs, so a projection without Item fields never loads the
+# Item and one without 'image' never loads the legacy base64 string.
+PRODUCT_FIELDS = {
+    'id': lambda product: product.id,
+    'name': lambda product: product.get_item().get_name(),
+    'description': lambda product: product.get_item().get_description(),
+    'category': lambda product: product.get_item().get_category(),
+    'digital_price': lambda product: str(product.get_digital_price()),
+    'physical_price': lambda product: str(product.get_physical_price()),
+    'image': lambda product: image_fields(product.get_item()),
+    'rating': lambda product: product.get_rating(),
+    'product_type': lambda product: product.get_item().get_type(),
+    'type': lambda product: product.get_item().get_type(),
+    'stock': lambda product: product.get_stock(),
+    'reviews': lambda product: product.get_reviews(),
+    'created_at': lambda product: product.get_item().get_created_at(),
+    'updated_at': lambda product: product.get_item().get_updated_at(),
+    'model_id': lambda product: product.get_item().get_model_id(),
+    'display_scenes_ids': lambda product: product.get_display_scenes(),
+    'model_url': model_url,
+    'display_scene_urls': display_scene_urls,
+}
+PRODUCT_LIST_FIELDS = ('id', 'name', 'description', 'category', 'digital_price', 'physical_price', 'image', 'rating', 'product_type', 'created_at')
+PRODUCT_DETAIL_FIELDS = ('id', 'name', 'description', 'digital_price', 'physical_price', 'category', 'type', 'image', 'stock', 'reviews', 'rating', 'created_at', 'updated_at', 'model_id', 'display_scenes_ids', 'model_url', 'display_scene_urls')
+
+def parse_fields(value, allowed):
+    if not value:
+        return allowed
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def serialize_product(product, fields):
+    data = {}
+    for field in fields:
+        if field == 'image':
+            data.update(PRODUCT_FIELDS[field](product))
+        else:
+            data[field] = PRODUCT_FIELDS[field](product)
+    return data
+
+def migrate_product_images(batch_size=50):
+    import io
     connection, root = get_connection()
+    try:
+        migrated = 0
+        for item in list(root.objectItems.values()):
+            if item.get_image_id() is not None or not item.get_image():
+                continue
+            image_file = io.BytesIO(base64.b64decode(item.get_image()))
+            image_file.name = f'item_{item.get_id()}'
+            item.set_image_id(create_product_image(root, image_file))
+            item.set_image(None)
+            migrated += 1
+            if migrated % batch_size == 0:
+                transaction.commit()
+        transaction.commit()
+        return migrated
+    except Exception:
+        transaction.abort()
+        raise
+    finally:
+        connection.close()
+
+def create_product(root, name, description, digital_price, physical_price, category, image, product_type, stock, model_files, scene_files, digital_available, physical_available, is_container, texture_files=None, wall_mountable=False):
     try:
         if digital_available and digital_price is None:
             raise ValueError("Digital price must be provided if digital version is available")
         if physical_available and physical_price is None:
             raise ValueError("Physical price must be provided if physical version is available")
-        image_base64 = base64.b64encode(image.read()).decode('utf-8')
+        image_id = create_product_image(root, image)
         display_scenes = []
         model_id = None
         if digital_available:
@@ -55,12 +230,13 @@ def create_product(name, description, digital_price, physical_price, category, i
             name=name,
             description=description,
             model_id=model_id,
-            image=image_base64,
+            image=None,
             category=category,
             type=product_type,
             is_container=is_container,
             created_at=current_datetime,
-            wall_mountable=wall_mountable
+            wall_mountable=wall_mountable,
+            image_id=image_id
         )
         root.objectItems[item_id] = item
 
@@ -76,16 +252,14 @@ def create_product(name, description, digital_price, physical_price, category, i
             display_scenes=display_scenes
         )
         root.products[product_id] = product
+        index_product(root, product)
         transaction.commit()
         return product_id
     except Exception:
         transaction.abort()
         raise
-    finally:
-        connection.close()
 
-def update_existing_product(product_id, name, description, digital_price, physical_price, category, image, product_type, stock, model_files, scene_files, digital_available, physical_available, is_container, texture_files, wall_mountable=False):
-    connection, root = get_connection()
+def update_existing_product(root, product_id, name, description, digital_price, physical_price, category, image, product_type, stock, model_files, scene_files, digital_available, physical_available, is_container, texture_files, wall_mountable=False):
     try:
         product_id = int(product_id)
         product = root.products[product_id]
@@ -105,8 +279,9 @@ def update_existing_product(product_id, name, description, digital_price, physic
         if category:
             item.category = category
         if image:
-            image_base64 = base64.b64encode(image.read()).decode('utf-8')
-            item.image = image_base64
+            release_product_image(root, item.get_image_id())
+            item.image_id = create_product_image(root, image)
+            item.image = None
         if product_type:
             item.type = product_type
         if stock is not None and stock >= 0:
@@ -141,15 +316,13 @@ def update_existing_product(product_id, name, description, digital_price, physic
 
         current_datetime = datetime.now()
         item.updated_at = current_datetime
+        index_product(root, product)
         transaction.commit()
     except Exception:
         transaction.abort()
         raise
-    finally:
-        connection.close()
 
-def delete_existing_product(product_id):
-    connection, root = get_connection()
+def delete_existing_product(root, product_id):
     try:
         product = root.products[product_id]
         item = product.item
@@ -158,6 +331,8 @@ def delete_existing_product(product_id):
         if model_id is not None:
             delete_product_3d_assets(root, model_id, product.display_scenes)
         
+        unindex_product(root, product_id)
+        release_product_image(root, item.get_image_id())
         del root.products[product_id]
         del root.objectItems[item.id]
         transaction.commit()
@@ -167,102 +342,73 @@ def delete_existing_product(product_id):
     except Exception:
         transaction.abort()
         raise
-    finally:
-        connection.close()
     
-def direct_create_Texture(texture_file):
-    connection, root = get_connection()
+def direct_create_Texture(root, texture_file):
     try:
-        texture_id = len(root.textures) + 1
+        texture_id = get_next_texture_id(root)
         filename = getattr(texture_file, 'name', f'texture_{texture_id}.png')
-        file_base64 = base64.b64encode(texture_file.read()).decode('utf-8')
 
-        root.textures[f'texture_{texture_id}'] = Texture(
+        asset = acquire_asset(root, texture_file)
+        set_asset(root, "textures", texture_id, Texture(
             texture_id=texture_id,
             filename=filename,
-            file=file_base64
-        )
+            file=asset.get_blob(),
+            digest=asset.get_digest()
+        ))
         transaction.commit()
         return texture_id
     except Exception:
         raise
     finally:
         transaction.abort()
-        connection.close()
 
 def get_next_texture_id(root):
-    if not root.textures:
-        return 1
-    existing_ids = [
-        int(key.split('_')[-1]) 
-        for key in root.textures.keys()
-        if key.startswith('texture_')
-    ]
-    return max(existing_ids) + 1
-
-def create_Texture(texture_file, root, texture_id=None):
-    if texture_id is None:
-        texture_id = get_next_texture_id(root)
-    else:
-        texture_id += 1
+    return next_id("textures")
+
+def create_Texture(texture_file, root):
+    texture_id = get_next_texture_id(root)
 
     filename = getattr(texture_file, 'name', f'texture_{texture_id}.png')
-    file_base64 = base64.b64encode(texture_file.read()).decode('utf-8')
 
-    root.textures[f'texture_{texture_id}'] = Texture(
+    asset = acquire_asset(root, texture_file)
+    set_asset(root, "textures", texture_id, Texture(
         texture_id=texture_id,
         filename=filename,
-        file=file_base64
-    )
+        file=asset.get_blob(),
+        digest=asset.get_digest()
+    ))
 
     return texture_id
 
 def delete_texture(texture_id, root):
-    textures = root.textures
-    if not textures or f'texture_{texture_id}' not in textures:
+    if not has_asset(root, "textures", texture_id):
         raise ValueError("Texture not found")
     
-    del textures[f'texture_{texture_id}']
+    release_asset(root, get_asset(root, "textures", texture_id).get_digest())
+    delete_asset(root, "textures", texture_id)
     
 def get_model_id(root):
-    if not root.objectModels:
-        return 1
-    existing_ids = [
-        int(key.split('_')[-1]) 
-        for key in root.objectModels.keys()
-        if key.startswith('model_')
-    ]
-    return max(existing_ids) + 1
+    return next_id("objectModels")
 
 def create_3d_model(root, model_file, texture_files=None):
     try:
         model_id = get_model_id(root)
         filename = getattr(model_file, 'name', f'model_{model_id}.glb')
         
-        file_content = model_file.read()
-        blob = Blob()
-        with blob.open('w') as f:
-            if isinstance(file_content, (bytes, bytearray)):
-                f.write(file_content)
-            else:
-                f.write(file_content.encode('latin-1'))
+        asset = acquire_asset(root, model_file)
 
         texture_ids = []
-        texture_id = None
         if texture_files:
             for tex in texture_files:
-                if texture_id is None:
-                    texture_id = create_Texture(tex, root)
-                else:
-                    texture_id = create_Texture(tex, root, texture_id)
-                texture_ids.append(texture_id)
+                texture_ids.append(create_Texture(tex, root))
 
-        root.objectModels[f'model_{model_id}'] = Model3D(
+        set_asset(root, "objectModels", model_id, Model3D(
             model_id=model_id,
-            file=blob,
+            file=asset.get_blob(),
             filename=filename,
-            textures=texture_ids
-        )
+            textures=texture_ids,
+            digest=asset.get_digest()
+        ))
         transaction.commit()
         return model_id
     except Exception:
@@ -274,22 +420,16 @@ def create_3d_model(root, model_file, texture_files=None):
 
 def update_3d_model(root, model_id, model_file=None, texture_files=None):
     try:
-        object_models = root.objectModels
-        if not object_models or f'model_{model_id}' not in object_models:
+        model = get_asset(root, "objectModels", model_id)
+        if model is None:
             raise ValueError("3D Model not found")
 
-        model = object_models[f'model_{model_id}']
-
         if model_file:
             filename = getattr(model_file, 'name', f'model_{model_id}.glb')
-            file_content = model_file.read()
-            blob = Blob()
-            with blob.open('w') as f:
-                if isinstance(file_content, (bytes, bytearray)):
-                    f.write(file_content)
-                else:
-                    f.write(file_content.encode('latin-1'))
-            model.file = blob
+            asset = acquire_asset(root, model_file)
+            release_asset(root, model.get_digest())
+            model.file = asset.get_blob()
+            model.digest = asset.get_digest()
             model.filename = filename
 
         for tex_id in model.get_textures():
@@ -309,33 +449,21 @@ def update_3d_model(root, model_id, model_file=None, texture_files=None):
         raise
         
 def get_next_display_scene_id(root):
-    if not root.displayScenes:
-        return 1
-    existing_ids = [
-        int(key.split('_')[-1]) 
-        for key in root.displayScenes.keys()
-        if key.startswith('display_scene_')
-    ]
-    return max(existing_ids) + 1
+    return next_id("displayScenes")
 
 def create_display_scene(root, model_file):
     try:
         display_scene_id = get_next_display_scene_id(root)
         filename = getattr(model_file, 'name', f'model_{display_scene_id}.glb')
         
-        file_content = model_file.read()
-        blob = Blob()
-        with blob.open('w') as f:
-            if isinstance(file_content, (bytes, bytearray)):
-                f.write(file_content)
-            else:
-                f.write(file_content.encode('latin-1'))
-
-        root.displayScenes[f'display_scene_{display_scene_id}'] = DisplayScene(
+        asset = acquire_asset(root, model_file)
+
+        set_asset(root, "displayScenes", display_scene_id, DisplayScene(
             scene_id=display_scene_id,
-            file=blob,
-            filename=filename
-        )
+            file=asset.get_blob(),
+            filename=filename,
+            digest=asset.get_digest()
+        ))
         transaction.commit()
         return display_scene_id
     except Exception:
@@ -346,11 +474,11 @@ def create_display_scene(root, model_file):
         raise
         
 def delete_display_scene(display_scene_id, root):
-    display_scenes = root.displayScenes
-    if not display_scenes or f'display_scene_{display_scene_id}' not in display_scenes:
+    if not has_asset(root, "displayScenes", display_scene_id):
         raise ValueError("Display Scene not found")
     
-    del display_scenes[f'display_scene_{display_scene_id}']
+    release_asset(root, get_asset(root, "displayScenes", display_scene_id).get_digest())
+    delete_asset(root, "displayScenes", display_scene_id)
         
 def update_display_scene(root, display_scene_ids, model_files):
     try:
@@ -359,7 +487,7 @@ def update_display_scene(root, display_scene_ids, model_files):
             raise ValueError("No Display Scenes found")
         
         for ds_id in display_scene_ids:
-            if f'display_scene_{ds_id}' not in display_scenes:
+            if not has_asset(root, "displayScenes", ds_id):
                 raise ValueError(f"Display Scene {ds_id} not found")
             delete_display_scene(ds_id, root)
 
@@ -368,19 +496,14 @@ def update_display_scene(root, display_scene_ids, model_files):
             display_scene_id = get_next_display_scene_id(root)
             filename = getattr(model_file, 'name', f'model_{display_scene_id}.glb')
             
-            file_content = model_file.read()
-            blob = Blob()
-            with blob.open('w') as f:
-                if isinstance(file_content, (bytes, bytearray)):
-                    f.write(file_content)
-                else:
-                    f.write(file_content.encode('latin-1'))
+            asset = acquire_asset(root, model_file)
 
-            root.displayScenes[f'display_scene_{display_scene_id}'] = DisplayScene(
+            set_asset(root, "displayScenes", display_scene_id, DisplayScene(
                 scene_id=display_scene_id,
-                file=blob,
-                filename=filename
-            )
+                file=asset.get_blob(),
+                filename=filename,
+                digest=asset.get_digest()
+            ))
             new_display_scene_ids.append(display_scene_id)
         
         transaction.commit()
@@ -394,22 +517,19 @@ def update_display_scene(root, display_scene_ids, model_files):
         
 def delete_product_3d_assets(root, model_id, display_scene_ids):
     try:
-        object_models = root.objectModels
-        if not object_models or f'model_{model_id}' not in object_models:
+        model = get_asset(root, "objectModels", model_id)
+        if model is None:
             return 
-
-        model = object_models[f'model_{model_id}']
         
         for texture_id in model.get_textures():
             delete_texture(texture_id, root)
         
-        del object_models[f'model_{model_id}']
+        release_asset(root, model.get_digest())
+        delete_asset(root, "objectModels", model_id)
         
-        display_scenes = root.displayScenes
-        if display_scenes:
-            for ds_id in display_scene_ids:
-                if f'display_scene_{ds_id}' in display_scenes:
-                    delete_display_scene(ds_id, root)
+        for ds_id in display_scene_ids:
+            if has_asset(root, "displayScenes", ds_id):
+                delete_display_scene(ds_id, root)
         
         transaction.commit()
     except Exception:
@@ -419,30 +539,81 @@ def delete_product_3d_assets(root, model_id, display_scene_ids):
             pass
         raise
 
-def fetch_3d_model(model_id: int):
-    _, root = get_connection()
-    object_models = root.objectModels
-    if not object_models:
-        return None
-    return object_models[f"model_{model_id}"]
-
-
-def fetch_display_scene(display_scene_id: int):
-    _, root = get_connection()
-    display_scenes = root.displayScenes
-    if not display_scenes:
-        return None
-    return display_scenes[f"display_scene_{display_scene_id}"]
-
-def fetch_texture(texture_id: int):
+def fetch_3d_model(root, model_id: int):
+    return get_asset(root, "objectModels", model_id)
+
+
+def fetch_display_scene(root, display_scene_id: int):
+    return get_asset(root, "displayScenes", display_scene_id)
+
+def texture_base64(texture):
+    with texture.open_file() as handle:
+        return base64.b64encode(handle.read()).decode('utf-8')
+
+def texture_content_type(texture):
+    return mimetypes.guess_type(texture.get_filename() or '')[0] or 'application/octet-stream'
+
+def texture_size(root, texture):
+    asset = root.assetBlobs.get(texture.get_digest()) if texture.get_digest() else None
+    if asset is not None:
+        return asset.get_size()
+    file = texture.get_file()
+    if isinstance(file, Blob):
+        return os.path.getsize(file.committed())
+    return len(base64.b64decode(file))
+
+# Texture ids, sizes and hashes for a model, all read from the caller's
+# connection. Each url carries the content version, so the binary texture
+# endpoint can mark it immutable and the viewer loads them in parallel.
+def texture_manifest(root, texture_ids, url_prefix):
+    entries = []
+    for texture_id in texture_ids:
+        texture = get_asset(root, "textures", texture_id)
+        if texture is None:
+            continue
+        file = texture.get_file()
+        url = f"{url_prefix}{texture_id}/"
+        if isinstance(file, Blob):
+            url += f"?v={asset_version(file, texture.get_digest())}"
+        entries.append({
+            'texture_id': texture_id,
+            'filename': texture.get_filename(),
+            'content_type': texture_content_type(texture),
+            'size': texture_size(root, texture),
+            'sha256': texture.get_digest(),
+            'url': url,
+        })
+    return entries
+
+# Raw texture bytes; textures still holding base64 text are decoded in full
+def texture_response(request, texture, private=False):
+    file = texture.get_file()
+    content_type = texture_content_type(texture)
+    if isinstance(file, Blob):
+        return blob_response(request, file, texture.get_filename(), content_type=content_type, private=private, digest=texture.get_digest(), attachment=False)
+    response = HttpResponse(base64.b64decode(file), content_type=content_type)
+    response['Cache-Control'] = 'private, no-cache' if private else 'public, no-cache'
+    return response
+
+# Rewrites base64 texture payloads as blobs, committing every batch_size textures
+def migrate_textures_to_blobs(batch_size=100):
     connection, root = get_connection()
     try:
-        textures = root.textures
-        if not textures:
-            return None
-        return textures[f"texture_{texture_id}"].get_file()
-    except Exception as e:
-        pass
-    finally:
+        migrated = 0
+        for texture in list(root.textures.values()):
+            if isinstance(texture.get_file(), Blob):
+                continue
+            blob = Blob()
+            with blob.open('w') as f:
+                f.write(base64.b64decode(texture.get_file()))
+            texture.file = blob
+            migrated += 1
+            if migrated % batch_size == 0:
+                transaction.commit()
+        transaction.commit()
+        return migrated
+    except Exception:
         transaction.abort()
+        raise
+    finally:
         connection.close()
\ No newline at end of file
@@ -0,0 +1,457 @@
+from BTrees.IIBTree import IIBTree, IITreeSet, intersection, multiunion
+from BTrees.OOBTree import OOBTree, OOTreeSet
+from BTrees.OIBTree import OIBTree
+from BTrees.Length import Length
+from datetime import datetime
+import base64
+import bisect
+import json
+import math
+import re
+from zodb.zodb_management import *
+import transaction
+
+# Secondary indexes over root.products, kept in the same transaction as the
+# product write. root.productIndexes maps index name -> value -> IITreeSet of
+# product ids; root.productIndexEntries remembers what each product was indexed
+# under so it can be unindexed after its Item has already been edited.
+PRODUCT_INDEXES = ('category', 'type', 'format', 'digital_price_bucket', 'physical_price_bucket')
+
+# Lower edges of the price buckets used for the facet histograms
+PRICE_BUCKETS = (0, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Sorted indexes are OOTreeSets of (missing, value, product_id), so products
+# without a value (no price) sort after every product that has one.
+PRODUCT_SORT_INDEXES = ('rating', 'created_at', 'digital_price', 'physical_price')
+PRODUCT_INDEX_VERSION = 6
+SORT_CANDIDATES_LIMIT = 2000
+
+SORT_MODES = {
+    'popularity': ('rating', True),
+    'newest': ('created_at', True),
+    'digital_price_low_to_high': ('digital_price', False),
+    'digital_price_high_to_low': ('digital_price', True),
+    'physical_price_low_to_high': ('physical_price', False),
+    'physical_price_high_to_low': ('physical_price', True),
+}
+
+# Full-text index: productIndexes['text'] maps a stemmed term to an IIBTree of
+# product id -> weight, with name terms counting more than description terms.
+TEXT_NAME_WEIGHT = 3
+TEXT_PREFIX_TERMS = 50
+STOP_WORDS = frozenset(('a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of', 'on', 'or', 'the', 'this', 'to', 'with'))
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def stem(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    for suffix in ('ing', 'ed'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    if len(word) > 4 and word.endswith(('ses', 'xes', 'zes', 'ches', 'shes')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+def tokenize(text):
+    return [stem(word) for word in TOKEN_RE.findall((text or '').lower()) if word not in STOP_WORDS]
+
+def text_weights(item):
+    weights = {}
+    for term in tokenize(item.get_name()):
+        weights[term] = weights.get(term, 0) + TEXT_NAME_WEIGHT
+    for term in tokenize(item.get_description()):
+        weights[term] = weights.get(term, 0) + 1
+    return tuple(weights.items())
+
+# Typeahead: productIndexes['suggest'] is an OOTreeSet of (lowercased name from
+# each word start, product_id), so "chai" finds both "Chair" and "Office Chair"
+# with one range scan.
+SUGGEST_MAX = 20
+
+def name_prefixes(name):
+    name = ' '.join((name or '').lower().split())
+    starts = [0] + [match.start() + 1 for match in re.finditer(' ', name)]
+    return tuple(dict.fromkeys(name[start:] for start in starts if name[start:]))
+
+# Category/type registry with reference counts, keeping the names as entered:
+# productIndexes['categories'] maps category -> product count and
+# productIndexes['types'] maps (category, type) -> product count.
+REGISTRY_INDEXES = ('categories', 'types')
+
+def _registry_change(tree, key, delta):
+    count = tree.get(key, 0) + delta
+    if count > 0:
+        tree[key] = count
+    elif key in tree:
+        del tree[key]
+
+def price_bucket(price):
+    if price is None:
+        return ()
+    return (PRICE_BUCKETS[max(bisect.bisect_right(PRICE_BUCKETS, float(price)) - 1, 0)],)
+
+def _sort_value(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+def product_index_values(product):
+    item = product.get_item()
+    formats = []
+    if product.is_digital_available():
+        formats.append('digital')
+    if product.is_physical_available():
+        formats.append('physical')
+    return {
+        'category': ((item.get_category() or '').lower(),),
+        'type': ((item.get_type() or '').lower(),),
+        'format': tuple(formats),
+        'digital_price_bucket': price_bucket(product.get_digital_price()),
+        'physical_price_bucket': price_bucket(product.get_physical_price()),
+        'rating': _sort_value(product.get_rating() or 0.0),
+        'created_at': _sort_value(item.get_created_at()),
+        'digital_price': _sort_value(product.get_digital_price()),
+        'physical_price': _sort_value(product.get_physical_price()),
+        'text': text_weights(item),
+        'name': item.get_name(),
+        'suggest': name_prefixes(item.get_name()),
+        'registry': (item.get_category() or '', item.get_type() or ''),
+    }
+
+def _sort_key(value, product_id):
+    if value is None:
+        return (1, 0.0, product_id)
+    return (0, value, product_id)
+
+def _index_tree(root, name):
+    tree = root.productIndexes.get(name)
+    if tree is None:
+        if name in PRODUCT_SORT_INDEXES + ('suggest', 'journal'):
+            tree = root.productIndexes[name] = OOTreeSet()
+        elif name in REGISTRY_INDEXES:
+            tree = root.productIndexes[name] = OIBTree()
+        else:
+            tree = root.productIndexes[name] = OOBTree()
+    return tree
+
+def index_product(root, product):
+    unindex_product(root, product.get_id())
+    values = product_index_values(product)
+    for name in PRODUCT_INDEXES:
+        tree = _index_tree(root, name)
+        for value in values[name]:
+            ids = tree.get(value)
+            if ids is None:
+                ids = tree[value] = IITreeSet()
+            ids.insert(product.get_id())
+    for name in PRODUCT_SORT_INDEXES:
+        _index_tree(root, name).insert(_sort_key(values[name], product.get_id()))
+    suggest = _index_tree(root, 'suggest')
+    for prefix in values['suggest']:
+        suggest.insert((prefix, product.get_id()))
+    category, product_type = values['registry']
+    _registry_change(_index_tree(root, 'categories'), category, 1)
+    _registry_change(_index_tree(root, 'types'), (category, product_type), 1)
+    text = _index_tree(root, 'text')
+    for term, weight in values['text']:
+        postings = text.get(term)
+        if postings is None:
+            postings = text[term] = IIBTree()
+        postings[product.get_id()] = weight
+    root.productIndexEntries[product.get_id()] = values
+    if getattr(root, 'productCount', None) is not None:
+        root.productCount.change(1)
+    _journal_change(root, product.get_id())
+
+def unindex_product(root, product_id):
+    values = root.productIndexEntries.get(product_id)
+    if values is None:
+        return
+    for name in PRODUCT_INDEXES:
+        tree = _index_tree(root, name)
+        for value in values.get(name, ()):
+            ids = tree.get(value)
+            if ids is None:
+                continue
+            ids.remove(product_id)
+            if not ids:
+                del tree[value]
+    for name in PRODUCT_SORT_INDEXES:
+        if name in values:
+            _index_tree(root, name).remove(_sort_key(values[name], product_id))
+    suggest = _index_tree(root, 'suggest')
+    for prefix in values.get('suggest', ()):
+        suggest.remove((prefix, product_id))
+    if 'registry' in values:
+        category, product_type = values['registry']
+        _registry_change(_index_tree(root, 'categories'), category, -1)
+        _registry_change(_index_tree(root, 'types'), (category, product_type), -1)
+    text = _index_tree(root, 'text')
+    for term, _ in values.get('text', ()):
+        postings = text.get(term)
+        if postings is None:
+            continue
+        postings.pop(product_id, None)
+        if not postings:
+            del text[term]
+    del root.productIndexEntries[product_id]
+    if getattr(root, 'productCount', None) is not None:
+        root.productCount.change(-1)
+    _journal_change(root, product_id)
+
+# Change journal of (catalog version, product_id) so per-process caches built
+# from the index entries can catch up on just the products written since the
+# version they were built at. Every transaction writing the catalog takes the
+# next version once, so each version in the journal has at least one entry.
+# Entries older than JOURNAL_KEEP_VERSIONS are trimmed a few at a time on
+# each write.
+JOURNAL_KEEP_VERSIONS = 10000
+JOURNAL_TRIM_BATCH = 20
+
+def _journal_change(root, product_id):
+    version = getattr(root, 'catalogVersion', None)
+    if version is None:
+        return
+    if not version._p_changed:
+        version.value += 1
+    journal = _index_tree(root, 'journal')
+    journal.insert((version.value, product_id))
+    expired = []
+    for key in journal.keys(None, (version.value - JOURNAL_KEEP_VERSIONS,)):
+        if len(expired) >= JOURNAL_TRIM_BATCH:
+            break
+        expired.append(key)
+    for key in expired:
+        journal.remove(key)
+
+def catalog_version(root):
+    version = getattr(root, 'catalogVersion', None)
+    return version.value if version is not None else 0
+
+# Products written after catalog version `since`, or None when the journal no
+# longer reaches back that far.
+def changed_product_ids(root, since):
+    journal = root.productIndexes.get('journal')
+    if journal is None or not journal or journal.minKey()[0] > since + 1:
+        return None
+    return {product_id for _, product_id in journal.keys((since + 1,))}
+
+def product_indexes_ready(root):
+    return getattr(root, 'productIndexVersion', 0) == PRODUCT_INDEX_VERSION
+
+def _lookup(root, name, value):
+    return root.productIndexes.get(name, {}).get(value.lower()) or IITreeSet()
+
+# Returns the ids matching every given filter, or None when nothing can be
+# narrowed (no indexed filter given, or the indexes have not been built yet).
+def candidate_product_ids(root, category=None, product_type=None, format=None):
+    if not product_indexes_ready(root):
+        return None
+    sets = []
+    if category is not None:
+        sets.append(_lookup(root, 'category', category))
+    if product_type is not None:
+        sets.append(_lookup(root, 'type', product_type))
+    if format is not None and format.lower() in ('digital', 'physical'):
+        sets.append(_lookup(root, 'format', format))
+    if not sets:
+        return None
+    sets.sort(key=len)
+    result = sets[0]
+    for ids in sets[1:]:
+        result = intersection(result, ids)
+    return multiunion([result]) if result is not None else IITreeSet()
+
+# BTrees only iterate forwards; walking down with maxKey() costs O(log n) per
+# step, which is cheap for the page sizes the shop asks for.
+def _iter_desc(tree, start):
+    try:
+        key = tree.maxKey(start)
+    except ValueError:
+        return
+    while True:
+        yield key
+        try:
+            key = tree.maxKey((key[0], key[1], key[2] - 1))
+        except ValueError:
+            return
+
+MISSING_START = (1, float('-inf'), 0)
+
+def _iter_sort_keys(tree, descending, after=None):
+    if not descending:
+        yield from (tree.keys(after, excludemin=True) if after is not None else tree.keys())
+        return
+    # Products with a value come first, largest first; those without stay last.
+    if after is None or after[0] == 0:
+        yield from _iter_desc(tree, MISSING_START if after is None else (after[0], after[1], after[2] - 1))
+        yield from tree.keys(MISSING_START)
+    else:
+        yield from tree.keys(after, excludemin=True)
+
+def _comes_after(key, after, descending):
+    if not descending or key[0] != after[0]:
+        return key > after
+    return key < after if key[0] == 0 else key > after
+
+def order_sort_keys(keys, descending):
+    keys = sorted(keys)
+    if descending:
+        keys = [key for key in reversed(keys) if key[0] == 0] + [key for key in keys if key[0] == 1]
+    return keys
+
+def product_sort_key(product, sort_by):
+    name, _ = SORT_MODES[sort_by]
+    return _sort_key(product_index_values(product)[name], product.get_id())
+
+# Yields sort keys (missing, value, product_id) in sort_by order, restricted to
+# candidate_ids when given and starting strictly after the `after` key, so a
+# cursor holding the last key of a page stays put when products are inserted.
+# Small candidate sets are sorted from the stored index entries instead of
+# walking the whole sorted index; neither path loads a Product.
+def iter_sorted_product_keys(root, sort_by, candidate_ids=None, after=None):
+    name, descending = SORT_MODES[sort_by]
+    tree = _index_tree(root, name)
+    if candidate_ids is not None and len(candidate_ids) <= SORT_CANDIDATES_LIMIT:
+        entries = root.productIndexEntries
+        keys = order_sort_keys((_sort_key(entries[product_id][name], product_id) for product_id in candidate_ids), descending)
+        if after is not None:
+            keys = [key for key in keys if _comes_after(key, after, descending)]
+        yield from keys
+        return
+    for key in _iter_sort_keys(tree, descending, after):
+        if candidate_ids is None or key[2] in candidate_ids:
+            yield key
+
+def iter_sorted_product_ids(root, sort_by, candidate_ids=None):
+    for key in iter_sorted_product_keys(root, sort_by, candidate_ids):
+        yield key[2]
+
+# Every query term must match. The last one also matches as a prefix, so a
+# partly typed word still finds products. Work is proportional to the posting
+# lists involved, not to the catalog size.
+def search_products(root, query):
+    terms = tokenize(query)
+    if not terms:
+        return {}
+    text = root.productIndexes.get('text', {})
+    total = max(product_count(root), 1)
+    term_scores = []
+    for position, term in enumerate(terms):
+        if position == len(terms) - 1:
+            matched = []
+            for key in text.keys(term):
+                if not key.startswith(term) or len(matched) >= TEXT_PREFIX_TERMS:
+                    break
+                matched.append(key)
+        else:
+            matched = [term] if term in text else []
+        scores = {}
+        for key in matched:
+            postings = text[key]
+            idf = math.log(1 + total / len(postings))
+            for product_id, weight in postings.items():
+                score = weight * idf
+                if score > scores.get(product_id, 0):
+                    scores[product_id] = score
+        if not scores:
+            return {}
+        term_scores.append(scores)
+    term_scores.sort(key=len)
+    results = {}
+    for product_id, score in term_scores[0].items():
+        for scores in term_scores[1:]:
+            if product_id not in scores:
+                break
+            score += scores[product_id]
+        else:
+            results[product_id] = score
+    return results
+
+# Relevance order: best score first, ties by product id
+def iter_relevance_keys(scores, candidate_ids=None, after=None):
+    keys = sorted((-score, product_id) for product_id, score in scores.items() if candidate_ids is None or product_id in candidate_ids)
+    if after is not None:
+        keys = [key for key in keys if key > after]
+    yield from keys
+
+def suggest_products(root, prefix, limit=8):
+    prefix = ' '.join((prefix or '').lower().split())
+    if not prefix:
+        return []
+    suggest = root.productIndexes.get('suggest')
+    if suggest is None:
+        return []
+    entries = root.productIndexEntries
+    suggestions = []
+    seen = set()
+    for name, product_id in suggest.keys((prefix,)):
+        if not name.startswith(prefix) or len(suggestions) >= min(limit, SUGGEST_MAX):
+            break
+        if product_id in seen:
+            continue
+        seen.add(product_id)
+        suggestions.append({'id': product_id, 'name': entries[product_id]['name']})
+    return suggestions
+
+def registered_categories(root):
+    return list(root.productIndexes['categories'].keys())
+
+def registered_product_types(root, category=None):
+    types = root.productIndexes['types']
+    if category is None:
+        return list(dict.fromkeys(product_type for _, product_type in types.keys()))
+    product_types = []
+    for registered_category, product_type in types.keys((category,)):
+        if registered_category != category:
+            break
+        product_types.append(product_type)
+    return product_types
+
+def product_count(root):
+    count = getattr(root, 'productCount', None)
+    if count is None or not product_indexes_ready(root):
+        return len(root.products)
+    return count()
+
+# Cursors are opaque to clients: the sort mode plus the position to resume
+# after, either a sort key, a product id, or an offset for unindexed sorts.
+def encode_cursor(sort_by, **position):
+    position['s'] = sort_by
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_cursor(cursor, sort_by):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, dict) or position.pop('s', None) != sort_by:
+        raise ValueError("Cursor does not match sort_by")
+    if 'k' in position:
+        position['k'] = tuple(position['k'])
+    return position
+
+def rebuild_product_indexes():
+    connection, root = get_connection()
+    try:
+        root.productIndexes.clear()
+        root.productIndexEntries.clear()
+        for name in PRODUCT_INDEXES + PRODUCT_SORT_INDEXES + REGISTRY_INDEXES + ('text', 'suggest', 'journal'):
+            _index_tree(root, name)
+        count = 0
+        for product in root.products.values():
+            index_product(root, product)
+            count += 1
+        root.productCount.set(count)
+        root.productIndexVersion = PRODUCT_INDEX_VERSION
+        transaction.commit()
+        return count
+    except Exception:
+        transaction.abort()
+        raise
+    finally:
+        connection.close()
@@ -5,7 +5,12 @@ from django.contrib.auth.decorators import login_required
 from django.http import FileResponse
 
 from .product_func import *
+from .product_facets import product_facets
+from .catalog_snapshot import get_catalog_snapshot
+from .catalog_cache import catalog_cached
+from BTrees.IIBTree import IITreeSet, intersection
 from zodb.zodb_management import *
+from zodb.blob_serving import blob_response
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -42,7 +47,7 @@ def add_product(request):
         if not digital_available and not physical_available:
             return JsonResponse({'error': 'At least one of digital or physical availability must be true'}, status=400)
 
-        product_id = create_product(name, description, digital_price, physical_price, category, image, product_type, stock, model_files = model_files, scene_files = scene_files, digital_available = digital_available, physical_available = physical_available, is_container = is_container, texture_files = texture_files, wall_mountable = wall_mountable)
+        product_id = create_product(request.zodb.root, name, description, digital_price, physical_price, category, image, product_type, stock, model_files = model_files, scene_files = scene_files, digital_available = digital_available, physical_available = physical_available, is_container = is_container, texture_files = texture_files, wall_mountable = wall_mountable)
 
         return JsonResponse({'message': 'Product created successfully', 'product_id': product_id}, status=201)
     except Exception as e:
@@ -84,7 +89,7 @@ def update_product(request):
         if not digital_available and not physical_available:
             return JsonResponse({'error': 'At least one of digital or physical availability must be true'}, status=400)
         
-        update_existing_product(product_id, name, description, digital_price, physical_price, category, image, product_type, stock, model_files, scene_files, digital_available, physical_available, is_container, texture_files, wall_mountable)
+        update_existing_product(request.zodb.root, product_id, name, description, digital_price, physical_price, category, image, product_type, stock, model_files, scene_files, digital_available, physical_available, is_container, texture_files, wall_mountable)
         return JsonResponse({'message': 'Product updated successfully', 'product_id': product_id}, status=200)
     except Product.DoesNotExist:
         return JsonResponse({'error': 'Product not found'}, status=404)
@@ -92,36 +97,107 @@ def update_product(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
-@require_http_methods(["POST"])
+@require_http_methods(["GET", "POST"])
+@catalog_cached
 def get_products(request):
-    connection, root = get_connection()
+    root = request.zodb_read.root
     try:
-        search_query = request.POST.get('search_query', None)
-        category = request.POST.get('category', None)
-        min_price = request.POST.get('min_price', None)
-        max_price = request.POST.get('max_price', None)
-        format = request.POST.get('format', None)
-        product_type =  request.POST.get('product_type', None)
-        sort_by = request.POST.get('sort_by', None)
+        params = request.POST if request.method == 'POST' else request.GET
+        search_query = params.get('search_query', None)
+        category = params.get('category', None)
+        min_price = params.get('min_price', None)
+        max_price = params.get('max_price', None)
+        format = params.get('format', None)
+        product_type =  params.get('product_type', None)
+        sort_by = params.get('sort_by', None)
+        limit = params.get('limit', None)
+        if limit is not None:
+            try:
+                limit = int(limit)
+                if limit <= 0:
+                    raise ValueError
+            except ValueError:
+                return JsonResponse({'error': 'Invalid limit value'}, status=400)
+        
+        cursor = params.get('cursor', None)
+        try:
+            after = decode_cursor(cursor, sort_by) if cursor else {}
+            fields = parse_fields(params.get('fields', None), PRODUCT_LIST_FIELDS)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
         product_list = []
-        for product in root.products.values():
+        candidate_ids = candidate_product_ids(root, category=category, product_type=product_type, format=format)
+        search_scores = None
+        if search_query and product_indexes_ready(root):
+            search_scores = search_products(root, search_query)
+            search_ids = IITreeSet(search_scores)
+            candidate_ids = search_ids if candidate_ids is None else intersection(candidate_ids, search_ids)
+        # Price ranges are the one filter the BTree indexes cannot answer;
+        # the columnar snapshot applies them, with the other filters, as
+        # array masks and sorts the survivors without loading any Product.
+        snapshot = None
+        if min_price is not None or max_price is not None:
+            try:
+                min_price_val = float(min_price) if min_price is not None else None
+            except ValueError:
+                return JsonResponse({'error': 'Invalid min_price value'}, status=400)
+            try:
+                max_price_val = float(max_price) if max_price is not None else None
+            except ValueError:
+                return JsonResponse({'error': 'Invalid max_price value'}, status=400)
+            snapshot = get_catalog_snapshot(root)
+        if snapshot is not None:
+            snapshot_rows = snapshot.select(
+                category=category,
+                product_type=product_type,
+                format=format,
+                min_price=min_price_val,
+                max_price=max_price_val,
+                candidate_ids=candidate_ids if search_scores is not None else None,
+            )
+            candidate_ids = IITreeSet(snapshot.ids[snapshot_rows].tolist())
+        # With the sorted indexes built, products arrive already in sort_by
+        # order and the loop can stop as soon as the page is full. Unsorted
+        # listings go by product id, so both kinds of cursor are positions
+        # rather than offsets and survive concurrent inserts.
+        relevance = search_scores is not None and sort_by in (None, 'relevance')
+        presorted = relevance or (sort_by in SORT_MODES and product_indexes_ready(root))
+        in_order = presorted or sort_by not in SORT_MODES
+        if relevance:
+            candidates = ((key, root.products[key[-1]]) for key in iter_relevance_keys(search_scores, candidate_ids, after.get('k')))
+        elif snapshot is not None and presorted:
+            candidates = ((key, root.products[key[-1]]) for key in snapshot.ordered_keys(snapshot_rows, sort_by, after.get('k')))
+        elif presorted:
+            candidates = ((key, root.products[key[-1]]) for key in iter_sorted_product_keys(root, sort_by, candidate_ids, after.get('k')))
+        else:
+            ids = candidate_ids if candidate_ids is not None else root.products
+            if in_order and 'id' in after:
+                ids = ids.keys(after['id'], excludemin=True)
+            else:
+                ids = ids.keys()
+            candidates = ((product_id, root.products[product_id]) for product_id in ids)
+        has_more = False
+        last_position = None
+        sort_rows = {}
+        # Filters already answered by the indexes are not re-checked, so a
+        # narrow projection can leave the Item unloaded.
+        check_item_filters = candidate_ids is None
+        for position, product in candidates:
             item = product.get_item()
-            item_category = item.get_category().lower()
-            item_name = item.get_name().lower()
-            if search_query is not None:
-                if search_query and search_query.lower() not in item_name:
+            if search_query is not None and search_scores is None:
+                if search_query and search_query.lower() not in item.get_name().lower():
                     continue
-            if category is not None and category.lower() != item_category:
+            if check_item_filters and category is not None and category.lower() != item.get_category().lower():
                 continue
-            if min_price is not None:
+            if min_price is not None and snapshot is None:
                 try:
                     min_price_val = float(min_price)
                     if (product.get_digital_price() is not None and product.get_digital_price() < min_price_val) and (product.get_physical_price() is not None and product.get_physical_price() < min_price_val):
                         continue
                 except ValueError:
                     return JsonResponse({'error': 'Invalid min_price value'}, status=400)
-            if max_price is not None:
+            if max_price is not None and snapshot is None:
                 try:
                     max_price_val = float(max_price)
                     if (product.get_digital_price() is not None and product.get_digital_price() > max_price_val) and (product.get_physical_price() is not None and product.get_physical_price() > max_price_val):
@@ -134,80 +210,121 @@ def get_products(request):
                 if format.lower() == 'physical' and not product.is_physical_available():
                     continue
 
-            if product_type is not None and product_type.lower() != item.get_type().lower():
+            if check_item_filters and product_type is not None and product_type.lower() != item.get_type().lower():
                 continue
+            if limit is not None and in_order and len(product_list) >= limit:
+                has_more = True
+                break
 
-            product_data = {
-                'id': product.id,
-                'name': item.get_name(),
-                'description': item.get_description(),
-                'category': item.get_category(),
-                'digital_price': str(product.get_digital_price()),
-                'physical_price': str(product.get_physical_price()),
-                'image': item.get_image(),
-                'rating': product.get_rating(),
-                'product_type': item.get_type(),
-                'created_at': item.get_created_at(),
-            }
+            product_data = serialize_product(product, fields)
+            if not in_order:
+                sort_rows[product_sort_key(product, sort_by)] = product_data
             product_list.append(product_data)
-        if sort_by is not None:
-            if sort_by == 'popularity' or sort_by == None:
-                product_list.sort(key=lambda x: x['rating'], reverse=True)
-            elif sort_by == 'newest':
-                product_list.sort(key=lambda x: x['created_at'], reverse=True)
-            elif sort_by == 'digital_price_low_to_high':
-                product_list.sort(key=lambda x: float(x['digital_price']) if x['digital_price'] not in [None, 'None'] else float('inf'))
-            elif sort_by == 'digital_price_high_to_low':
-                product_list.sort(key=lambda x: float(x['digital_price']) if x['digital_price'] not in [None, 'None'] else float('-inf'), reverse=True)
-            elif sort_by == 'physical_price_low_to_high':
-                product_list.sort(key=lambda x: float(x['physical_price']) if x['physical_price'] not in [None, 'None'] else float('inf'))
-            elif sort_by == 'physical_price_high_to_low':
-                product_list.sort(key=lambda x: float(x['physical_price']) if x['physical_price'] not in [None, 'None'] else float('-inf'), reverse=True)
+            last_position = position
+        if not in_order:
+            product_list = [sort_rows[key] for key in order_sort_keys(sort_rows, SORT_MODES[sort_by][1])]
+        # Totals come from index sizes; filters the indexes cannot answer
+        # (search text, price range) would need a full scan, so total is null.
+        if not in_order:
+            total = len(product_list)
+        elif (search_query and search_scores is None) or ((min_price is not None or max_price is not None) and snapshot is None):
+            total = None
+        elif candidate_ids is not None:
+            total = len(candidate_ids)
+        elif category is not None or product_type is not None or format is not None:
+            total = None
+        else:
+            total = product_count(root)
+        next_cursor = None
+        if limit is not None:
+            if not in_order:
+                offset = after.get('o', 0)
+                has_more = offset + limit < len(product_list)
+                product_list = product_list[offset:offset + limit]
+                if has_more:
+                    next_cursor = encode_cursor(sort_by, o=offset + limit)
+            elif has_more:
+                if presorted:
+                    next_cursor = encode_cursor(sort_by, k=list(last_position))
+                else:
+                    next_cursor = encode_cursor(sort_by, id=last_position)
     
-        return JsonResponse({'products': product_list}, status=200)
+        return JsonResponse({'products': product_list, 'total': total, 'next_cursor': next_cursor}, status=200)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def get_product_facets(request):
+    root = request.zodb_read.root
+    try:
+        if not product_indexes_ready(root):
+            return JsonResponse({'error': 'Product indexes have not been built'}, status=503)
+        min_price = request.POST.get('min_price', None)
+        max_price = request.POST.get('max_price', None)
+        try:
+            min_price = float(min_price) if min_price is not None else None
+            max_price = float(max_price) if max_price is not None else None
+        except ValueError:
+            return JsonResponse({'error': 'Invalid price value'}, status=400)
+        facets = product_facets(
+            root,
+            category=request.POST.get('category', None),
+            product_type=request.POST.get('product_type', None),
+            format=request.POST.get('format', None),
+            search_query=request.POST.get('search_query', None),
+            min_price=min_price,
+            max_price=max_price,
+        )
+        return JsonResponse(facets, status=200)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
-    finally:
-        transaction.abort()
-        connection.close()
 
 @require_http_methods(["GET"])
+def get_product_suggestions(request):
+    root = request.zodb_read.root
+    try:
+        prefix = request.GET.get('q', '')
+        try:
+            limit = int(request.GET.get('limit', 8))
+            if limit <= 0:
+                raise ValueError
+        except ValueError:
+            return JsonResponse({'error': 'Invalid limit value'}, status=400)
+        if product_indexes_ready(root):
+            suggestions = suggest_products(root, prefix, limit)
+        else:
+            # Until the indexes are built, fall back to scanning names
+            suggestions = []
+            prefix = ' '.join(prefix.lower().split())
+            for product in root.products.values():
+                if len(suggestions) >= min(limit, SUGGEST_MAX) or not prefix:
+                    break
+                name = product.get_item().get_name()
+                if any(word.startswith(prefix) for word in name_prefixes(name)):
+                    suggestions.append({'id': product.id, 'name': name})
+        return JsonResponse({'suggestions': suggestions}, status=200)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+@require_http_methods(["GET"])
+@catalog_cached
 def get_product_detail(request, product_id):
-    connection, root = get_connection()
+    root = request.zodb_read.root
     try:
         if not product_id:
             return JsonResponse({'error': 'Product ID is required'}, status=400)
+        try:
+            fields = parse_fields(request.GET.get('fields', None), PRODUCT_DETAIL_FIELDS)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         product = root.products[product_id]
-        item = product.item
-        
-        product_data = {
-            'id': product.id,
-            'name': item.get_name(),
-            'description': item.get_description(),
-            'digital_price': str(product.get_digital_price()),
-            'physical_price': str(product.get_physical_price()),
-            'category': item.get_category(),
-            'type': item.get_type(),
-            'image': item.get_image(),
-            'stock': product.get_stock(),
-            'reviews': product.get_reviews(),
-            'rating': product.get_rating(),
-            'created_at': item.get_created_at(),
-            'updated_at': item.get_updated_at(),
-            'model_id': item.get_model_id(),
-            'display_scenes_ids': product.get_display_scenes()
-        }
+        product_data = serialize_product(product, fields)
         return JsonResponse({'product': product_data}, status=200)
     except Product.DoesNotExist:
         return JsonResponse({'error': 'Product not found'}, status=404)
     except Exception as e:
-        try:
-            transaction.abort()
-        except Exception:
-            pass
         return JsonResponse({"error": str(e)}, status=500)
-    finally:
-        connection.close()
 
 @csrf_exempt
 @require_http_methods(["DELETE"])
@@ -217,7 +334,7 @@ def delete_product(request, product_id):
         if not product_id:
             return JsonResponse({'error': 'Product ID is required'}, status=400)
         
-        delete_existing_product(product_id)
+        delete_existing_product(request.zodb.root, product_id)
         
         return JsonResponse({'message': 'Product deleted successfully'}, status=200)
     except Product.DoesNotExist:
@@ -229,7 +346,7 @@ def delete_product(request, product_id):
 @require_http_methods(["GET"])
 def get_3d_model(request, model_id):
     try:
-        model = fetch_3d_model(model_id)
+        model = fetch_3d_model(request.zodb.root, model_id)
         if not model:
             return JsonResponse({'error': 'Model not found'}, status=404)
 
@@ -237,15 +354,14 @@ def get_3d_model(request, model_id):
         if blob is None:
             return JsonResponse({'error': 'Model file not found'}, status=404)
 
-        response = FileResponse(blob.open('r'), as_attachment=True, filename=model.get_filename())
-        return response
+        return blob_response(request, blob, model.get_filename(), digest=model.get_digest())
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
     
 @require_http_methods(["GET"])
 def get_display_scene(request, display_scene_id):
     try:
-        scene = fetch_display_scene(display_scene_id)
+        scene = fetch_display_scene(request.zodb.root, display_scene_id)
         if not scene:
             return JsonResponse({'error': 'Scene not found'}, status=404)
 
@@ -253,7 +369,24 @@ def get_display_scene(request, display_scene_id):
         if blob is None:
             return JsonResponse({'error': 'Scene file not found'}, status=404)
 
-        response = FileResponse(blob.open('r'), as_attachment=True, filename=scene.get_filename())
+        return blob_response(request, blob, scene.get_filename(), digest=scene.get_digest())
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    
+# Image ids are never reused for new content, so responses can be cached forever
+@require_http_methods(["GET"])
+def get_product_image(request, image_id, size):
+    root = request.zodb_read.root
+    try:
+        if size != 'original' and size not in PRODUCT_IMAGE_SIZES:
+            return JsonResponse({'error': 'Invalid image size'}, status=400)
+        image = root.productImages.get(image_id)
+        if image is None:
+            return JsonResponse({'error': 'Image not found'}, status=404)
+
+        handle, content_type = image.open_size(size)
+        response = FileResponse(handle, content_type=content_type)
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
         return response
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -261,23 +394,54 @@ def get_display_scene(request, display_scene_id):
 @require_http_methods(["GET"])
 def get_textures(request, model_id):
     try:
-        model = fetch_3d_model(model_id)
+        model = fetch_3d_model(request.zodb.root, model_id)
         if not model:
             return JsonResponse({'error': 'Model not found'}, status=404)
 
         texture_files = []
         for tex_id in model.get_textures():
-            texture = fetch_texture(tex_id)
-            texture_files.append({'texture_id': tex_id, 'file': texture})
+            texture = get_asset(request.zodb.root, "textures", tex_id)
+            texture_files.append({'texture_id': tex_id, 'file': texture_base64(texture) if texture else None})
 
         return JsonResponse({'textures': texture_files}, status=200)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+@require_http_methods(["GET"])
+def get_texture_manifest(request, model_id):
+    try:
+        model = fetch_3d_model(request.zodb.root, model_id)
+        if not model:
+            return JsonResponse({'error': 'Model not found'}, status=404)
+
+        textures = texture_manifest(request.zodb.root, model.get_textures(), f"/products/texture/{model_id}/")
+        return JsonResponse({'textures': textures}, status=200)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@require_http_methods(["GET"])
+def get_texture_file(request, model_id, texture_id):
+    try:
+        model = fetch_3d_model(request.zodb.root, model_id)
+        if not model or texture_id not in model.get_textures():
+            return JsonResponse({'error': 'Texture not found'}, status=404)
+
+        texture = get_asset(request.zodb.root, "textures", texture_id)
+        if texture is None:
+            return JsonResponse({'error': 'Texture not found'}, status=404)
+
+        return texture_response(request, texture)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
     
 @require_http_methods(["GET"])
+@catalog_cached
 def get_all_categories(request):
-    connection, root = get_connection()
+    root = request.zodb_read.root
     try:
+        if product_indexes_ready(root):
+            categories = [category for category in registered_categories(root) if category.lower() != "widget"]
+            return JsonResponse({'categories': categories}, status=200)
         categories = set()
         for obj in root.objectItems.values():
             try:
@@ -287,20 +451,18 @@ def get_all_categories(request):
                 continue
         return JsonResponse({'categories': list(categories)}, status=200)
     except Exception as e:
-        try:
-            transaction.abort()
-        except Exception:
-            pass
         return JsonResponse({"error": str(e)}, status=500)
-    finally:
-        connection.close()
         
 @csrf_exempt
-@require_http_methods(["POST"])
+@require_http_methods(["GET", "POST"])
+@catalog_cached
 def get_all_product_types(request):
-    connection, root = get_connection()
+    root = request.zodb_read.root
     try:
-        category = request.POST.get('category', None)
+        params = request.POST if request.method == 'POST' else request.GET
+        category = params.get('category', None)
+        if product_indexes_ready(root):
+            return JsonResponse({'product_types': registered_product_types(root, category)}, status=200)
         product_types = set()
         for obj in root.objectItems.values():
             try:
@@ -310,10 +472,4 @@ def get_all_product_types(request):
                 continue
         return JsonResponse({'product_types': list(product_types)}, status=200)
     except Exception as e:
-        try:
-            transaction.abort()
-        except Exception:
-            pass
-        return JsonResponse({"error": str(e)}, status=500)
-    finally:
-        connection.close()
\ No newline at end of file
+        return JsonResponse({"error": str(e)}, status=500)
\ No newline at end of file
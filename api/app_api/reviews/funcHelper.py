@@ -1,10 +1,12 @@
 from .models import Review
 from django.db.models import Avg
+from app_api.products.product_index import index_product
 
-def update_average_rating(product):
+def update_average_rating(root, product):
     avg = Review.objects.filter(product_id=product.get_id()).aggregate(avg=Avg('rating'))['avg']
     if avg is None:
         product.set_rating(0.0)
     else:
         avg = round(max(0.0, min(5.0, float(avg))), 2)
         product.set_rating(avg)
+    index_product(root, product)
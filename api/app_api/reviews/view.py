@@ -12,7 +12,7 @@ import base64
 @login_required
 @require_http_methods(["POST"])
 def add_review(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -51,7 +51,7 @@ def add_review(request):
             image=image_base64
         )
         product.add_review(review.id)
-        update_average_rating(product)
+        update_average_rating(root, product)
         transaction.commit()
 
         return JsonResponse({'message': 'Review added successfully'}, status=201)
@@ -59,13 +59,12 @@ def add_review(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
 
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
 def edit_review(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -105,7 +104,7 @@ def edit_review(request):
             review.image = None
 
         review.save()
-        update_average_rating(product)
+        update_average_rating(root, product)
         transaction.commit()
         
         return JsonResponse({'message': 'Review updated successfully'}, status=200)
@@ -113,13 +112,12 @@ def edit_review(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
 
 @csrf_exempt
 @login_required
 @require_http_methods(["DELETE"])
 def delete_review(request, review_id):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -143,7 +141,7 @@ def delete_review(request, review_id):
         if review_id in product.get_reviews():
             product.remove_review(review_id)
         
-        update_average_rating(product)
+        update_average_rating(root, product)
         transaction.commit()
         
         return JsonResponse({'message': 'Review deleted successfully'}, status=200)
@@ -151,7 +149,6 @@ def delete_review(request, review_id):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
 
 @login_required
 @require_http_methods(["GET"])
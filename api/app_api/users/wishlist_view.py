@@ -3,6 +3,7 @@ from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from app_api.products.objectModels import Product
+from app_api.products.product_func import image_fields
 from zodb.zodb_management import *
 import transaction
 
@@ -10,7 +11,7 @@ import transaction
 @login_required
 @require_http_methods(["POST"])
 def add_to_wishlist(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -41,7 +42,6 @@ def add_to_wishlist(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
 
 @csrf_exempt
 @login_required
@@ -66,7 +66,7 @@ def remove_from_wishlist(request, product_id):
 @login_required
 @require_http_methods(["GET"])
 def get_wishlist(request):
-    connection, root = get_connection()
+    root = request.zodb.root
     try:
         customer = request.user.customer
 
@@ -86,7 +86,7 @@ def get_wishlist(request):
                 'physical_price': str(product.get_physical_price()),
                 'category': item.get_category(),
                 'type': item.get_type(),
-                'image': item.get_image(),
+                **image_fields(item),
             }
             products.append(product_data)
 
@@ -95,4 +95,3 @@ def get_wishlist(request):
         return JsonResponse({"error": str(e)}, status=500)
     finally:
         transaction.abort()
-        connection.close()
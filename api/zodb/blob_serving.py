@@ -0,0 +1,185 @@
+import base64
+import hashlib
+import os
+import re
+import time
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, quote_etag
+from persistent.TimeStamp import TimeStamp
+from ZODB.utils import oid_repr, serial_repr
+
+# Blob downloads with strong validators and byte ranges. The version is the
+# blob's oid plus its serial, which changes whenever the blob is rewritten,
+# so it identifies the exact bytes without hashing them. Assets from the
+# content-addressed store pass their SHA-256 instead, which stays the same
+# when identical bytes are uploaded again. URLs carrying the current version
+# as ?v= never change content and are cached as immutable.
+BLOB_CHUNK_SIZE = 256 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 31536000
+
+def blob_version(blob):
+    blob._p_activate()
+    return f"{oid_repr(blob._p_oid)}-{serial_repr(blob._p_serial)}"
+
+def blob_etag(blob):
+    return quote_etag(blob_version(blob))
+
+def asset_version(blob, digest=None):
+    return f"sha256-{digest}" if digest else blob_version(blob)
+
+def blob_last_modified(blob):
+    blob._p_activate()
+    return TimeStamp(blob._p_serial).timeTime()
+
+def _etag_listed(header, etag):
+    if not header:
+        return False
+    return header.strip() == '*' or etag in [tag.strip() for tag in header.split(',')]
+
+# Single ranges only; anything else (multiple ranges, other units) gets the
+# whole file, which RFC 9110 allows. No range of an empty file is satisfiable.
+def parse_range(header, size):
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    if size == 0:
+        return ()
+    start, end = match.groups()
+    if start == '':
+        length = int(end)
+        if length == 0:
+            return ()
+        return (max(size - length, 0), size - 1)
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return ()
+    return (start, end)
+
+def _read_range(handle, start, end):
+    try:
+        handle.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = handle.read(min(BLOB_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+# Opt-in offloading: with ZODB_BLOB_SERVE set to "x-accel" (nginx) or
+# "x-sendfile" (Apache/lighttpd) the view only resolves the committed blob
+# file and the front proxy sends the bytes, including ranges. Example nginx
+# location for the blob directory:
+#
+#   location /_blobs/ {
+#       internal;
+#       alias /app/zodb_data/blobs/;
+#       etag off;
+#   }
+def blob_serve_mode():
+    return (getattr(settings, "ZODB_BLOB_SERVE", "") or "").lower()
+
+def blob_root():
+    configured = getattr(settings, "ZODB_BLOB_ROOT", None)
+    if configured:
+        return configured
+    # Every blob-capable storage keeps its temp dir at <blob dir>/tmp
+    from zodb.zodb_management import db
+    return os.path.dirname(db.storage.temporaryDirectory())
+
+def blob_path(blob):
+    return os.path.relpath(blob.committed(), blob_root()).replace(os.sep, '/')
+
+def _offloaded(blob, content_type):
+    mode = blob_serve_mode()
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel':
+        prefix = getattr(settings, "ZODB_BLOB_ACCEL_PREFIX", "/_blobs/")
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + blob_path(blob)
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = blob.committed()
+    else:
+        raise ValueError(f"Unknown ZODB_BLOB_SERVE mode: {mode}")
+    return response
+
+# Signed, expiring blob URLs in the format of nginx's secure_link module, so
+# the proxy checks them without calling Django:
+#
+#   location /signed-blobs/ {
+#       secure_link $arg_md5,$arg_expires;
+#       secure_link_md5 "$secure_link_expires$uri <ZODB_BLOB_URL_SECRET>";
+#       if ($secure_link = "") { return 403; }
+#       if ($secure_link = "0") { return 410; }
+#       alias /app/zodb_data/blobs/;
+#   }
+def blob_url_signing_enabled():
+    return bool(getattr(settings, "ZODB_BLOB_URL_SECRET", None))
+
+def sign_blob_path(path, expires):
+    secret = settings.ZODB_BLOB_URL_SECRET
+    digest = hashlib.md5(f"{expires}{path} {secret}".encode()).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip('=')
+
+def signed_blob_url(blob, ttl=None):
+    if ttl is None:
+        ttl = getattr(settings, "ZODB_BLOB_URL_TTL", 300)
+    expires = int(time.time()) + ttl
+    prefix = getattr(settings, "ZODB_BLOB_SIGNED_PREFIX", "/signed-blobs/")
+    path = prefix.rstrip('/') + '/' + blob_path(blob)
+    return f"{path}?md5={sign_blob_path(path, expires)}&expires={expires}", expires
+
+def blob_response(request, blob, filename, content_type='model/gltf-binary', private=False, digest=None, attachment=True):
+    version = asset_version(blob, digest)
+    etag = quote_etag(version)
+    scope = 'private' if private else 'public'
+    if request.GET.get('v') == version:
+        cache_control = f'{scope}, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f'{scope}, no-cache'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(blob_last_modified(blob)),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': cache_control,
+    }
+    if _etag_listed(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    if blob_serve_mode():
+        response = _offloaded(blob, content_type)
+        response['Content-Disposition'] = content_disposition_header(attachment, filename)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    handle = blob.open('r')
+    size = os.fstat(handle.fileno()).st_size
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = parse_range(range_header, size)
+
+    if byte_range == ():
+        handle.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is not None:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(handle, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = StreamingHttpResponse(_read_range(handle, 0, size - 1), content_type=content_type)
+        response['Content-Length'] = str(size)
+    response['Content-Disposition'] = content_disposition_header(attachment, filename)
+    for name, value in headers.items():
+        response[name] = value
+    return response
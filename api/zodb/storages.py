@@ -0,0 +1,113 @@
+import os
+from django.conf import settings
+import ZODB.FileStorage
+from ZODB.blob import BlobStorage
+
+# Storage backends only: nothing here opens a storage on import, so management
+# commands can use it without locking zodb.fs the way zodb_management does.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ZODB_DIR = os.path.join(BASE_DIR, 'zodb_data')
+BLOB_DIR = os.path.join(ZODB_DIR, 'blobs')
+os.makedirs(ZODB_DIR, exist_ok=True)
+os.makedirs(BLOB_DIR, exist_ok=True)
+ZODB_FILE = os.path.join(ZODB_DIR, 'zodb.fs')
+ZEO_CONF_FILE = os.path.join(ZODB_DIR, 'zeo.conf')
+
+ZEO_CLIENT_SLOTS = 64
+_zeo_client_lock = None
+
+def parse_zeo_address(address):
+    host, _, port = str(address).rpartition(':')
+    if host and port.isdigit():
+        return (host, int(port))
+    return address
+
+# Each worker process claims a free client slot so its persistent ZEO cache
+# file survives restarts without two processes sharing the same cache.
+def _claim_zeo_client(cache_dir, client):
+    import zc.lockfile
+    for slot in range(ZEO_CLIENT_SLOTS):
+        try:
+            lock = zc.lockfile.LockFile(os.path.join(cache_dir, f'{client}-{slot}.lock'))
+        except zc.lockfile.LockError:
+            continue
+        return f'{client}-{slot}', lock
+    return None, None
+
+def release_zeo_client():
+    global _zeo_client_lock
+    if _zeo_client_lock is not None:
+        _zeo_client_lock.close()
+        _zeo_client_lock = None
+
+def open_file_storage(read_only=False):
+    file_storage = ZODB.FileStorage.FileStorage(ZODB_FILE, read_only=read_only)
+    return BlobStorage(BLOB_DIR, file_storage)
+
+def open_zeo_storage():
+    import ZEO.ClientStorage
+    global _zeo_client_lock
+    blob_dir = getattr(settings, "ZODB_ZEO_BLOB_DIR", None) or BLOB_DIR
+    cache_dir = getattr(settings, "ZODB_ZEO_CACHE_DIR", None) or os.path.join(ZODB_DIR, 'zeo_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    client, _zeo_client_lock = _claim_zeo_client(cache_dir, getattr(settings, "ZODB_ZEO_CLIENT", "api"))
+    return ZEO.ClientStorage.ClientStorage(
+        parse_zeo_address(getattr(settings, "ZODB_ZEO_ADDRESS", "127.0.0.1:8100")),
+        blob_dir=blob_dir,
+        shared_blob_dir=getattr(settings, "ZODB_ZEO_SHARED_BLOB_DIR", True),
+        client=client,
+        var=cache_dir,
+        cache_size=getattr(settings, "ZODB_ZEO_CACHE_SIZE", 64 * 1024 * 1024),
+    )
+
+# Defaults to the Django "default" PostGIS database so no extra service is needed
+def relstorage_dsn():
+    dsn = getattr(settings, "ZODB_RELSTORAGE_DSN", None)
+    if dsn:
+        return dsn
+    database = settings.DATABASES["default"]
+    return (
+        f"dbname='{database['NAME']}' user='{database['USER']}' password='{database['PASSWORD']}' "
+        f"host='{database['HOST']}' port='{database['PORT']}'"
+    )
+
+def open_relstorage():
+    from relstorage.options import Options
+    from relstorage.storage import RelStorage
+    from relstorage.adapters.postgresql import PostgreSQLAdapter
+    # Without a shared blob dir, blobs are stored in Postgres and blob_dir is
+    # only this process's local cache of them.
+    options = Options(
+        keep_history=getattr(settings, "ZODB_RELSTORAGE_KEEP_HISTORY", False),
+        blob_dir=getattr(settings, "ZODB_RELSTORAGE_BLOB_DIR", None) or os.path.join(ZODB_DIR, 'relstorage_blobs'),
+        shared_blob_dir=getattr(settings, "ZODB_RELSTORAGE_SHARED_BLOB_DIR", False),
+        blob_cache_size=getattr(settings, "ZODB_RELSTORAGE_BLOB_CACHE_SIZE", 512 * 1024 * 1024),
+        cache_local_mb=getattr(settings, "ZODB_RELSTORAGE_CACHE_MB", 64),
+    )
+    adapter = PostgreSQLAdapter(dsn=relstorage_dsn(), options=options)
+    return RelStorage(adapter, options=options)
+
+def write_zeo_server_config(address):
+    with open(ZEO_CONF_FILE, 'w') as f:
+        f.write(
+            "<zeo>\n"
+            f"  address {address}\n"
+            "</zeo>\n"
+            "<filestorage>\n"
+            f"  path {ZODB_FILE}\n"
+            f"  blob-dir {BLOB_DIR}\n"
+            "</filestorage>\n"
+        )
+    return ZEO_CONF_FILE
+
+STORAGE_BACKENDS = {
+    "file": open_file_storage,
+    "zeo": open_zeo_storage,
+    "relstorage": open_relstorage,
+}
+
+def open_storage():
+    backend = getattr(settings, "ZODB_STORAGE", "file")
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown ZODB_STORAGE backend: {backend}")
+    return STORAGE_BACKENDS[backend]()
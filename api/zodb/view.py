@@ -0,0 +1,15 @@
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+from django.contrib.auth.decorators import login_required
+from zodb.zodb_management import get_pack_stats, get_pool_stats
+from app_api.products.catalog_cache import cache_stats
+
+@login_required
+@require_http_methods(["GET"])
+def get_zodb_stats(request):
+    if not (request.user.is_staff or request.user.is_admin):
+        return JsonResponse({'error': 'Only staff can view ZODB stats'}, status=403)
+    try:
+        return JsonResponse({'pool': get_pool_stats(), 'pack': get_pack_stats(), 'catalog_cache': cache_stats}, status=200)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
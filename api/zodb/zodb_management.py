@@ -1,52 +1,573 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from django.conf import settings
 import ZODB
-import ZODB.FileStorage
-from ZODB.blob import BlobStorage
+from ZODB.POSException import ConflictError, ReadOnlyError
+from ZODB.utils import u64
 import BTrees.OOBTree
+import BTrees.IOBTree
+import BTrees.Length
+import persistent
+import transaction
+from zodb.storages import *
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-ZODB_DIR = os.path.join(BASE_DIR, 'zodb_data')
-BLOB_DIR = os.path.join(ZODB_DIR, 'blobs')
-os.makedirs(ZODB_DIR, exist_ok=True)
-os.makedirs(BLOB_DIR, exist_ok=True)
-ZODB_FILE = os.path.join(ZODB_DIR, 'zodb.fs')
+storage = open_storage()
+db = ZODB.DB(
+    storage,
+    pool_size=getattr(settings, "ZODB_POOL_SIZE", 7),
+    cache_size=getattr(settings, "ZODB_CACHE_SIZE", 2000),
+)
 
-file_storage = ZODB.FileStorage.FileStorage(ZODB_FILE)
-storage = BlobStorage(BLOB_DIR, file_storage)
-db = ZODB.DB(storage)
+# Root trees by the schema step that introduced them
+SCHEMA_TREES = {
+    1: (
+        "objectModels",
+        "textures",
+        "displayScenes",
+        "objectItems",
+        "ownedItems",
+        "containerOwnedItems",
+        "nonContainerOwnedItems",
+        "products",
+        "digitalHomes",
+        "homeObjectModels",
+        "placedItems",
+        "sequences",
+    ),
+    2: ("productImages",),
+    3: ("productIndexes", "productIndexEntries"),
+    5: ("assetBlobs",),
+}
+ROOT_TREES = tuple(name for names in SCHEMA_TREES.values() for name in names)
+
+# Asset trees keyed by integer id. Databases created before this still hold
+# OOBTrees keyed 'model_{id}' etc. until `manage.py migrate_asset_trees` runs;
+# the *_asset accessors below work with either layout.
+ASSET_KEY_PREFIXES = {
+    "objectModels": "model_",
+    "textures": "texture_",
+    "displayScenes": "display_scene_",
+}
+
+INT_KEYED_TREES = set(ASSET_KEY_PREFIXES) | {"productImages", "productIndexEntries"}
+
+def _create_trees(root, names):
+    for name in names:
+        if not hasattr(root, name):
+            if name in INT_KEYED_TREES:
+                setattr(root, name, BTrees.IOBTree.BTree())
+            else:
+                setattr(root, name, BTrees.OOBTree.BTree())
+
+def _create_root_trees(root):
+    _create_trees(root, ROOT_TREES)
+
+# Bumped once by every transaction that writes the catalog. It is a Sequence,
+# which does not resolve conflicts, so catalog writes are serialized and the
+# values commit in order; the product index journal is keyed on them. Its
+# _p_serial is the id of the last transaction that changed a product, which
+# the catalog ETags are built from. Databases from before step 6 hold a Length.
+def _create_catalog_version(root):
+    version = getattr(root, "catalogVersion", None)
+    if not isinstance(version, Sequence):
+        root.catalogVersion = Sequence(version() if version is not None else 0)
+
+# The journal was keyed on wall-clock time before; its entries cannot be
+# compared with catalog versions, and caches rebuild once after this.
+def _version_catalog_journal(root):
+    _create_catalog_version(root)
+    journal = root.productIndexes.get("journal")
+    if journal is not None:
+        journal.clear()
+
+# Product index state; rebuild_product_indexes() sets the version once the
+# indexes are complete. Until then productIndexVersion is 0 and productCount
+# counts the products indexed so far.
+def _create_product_index_state(root):
+    if not hasattr(root, "productIndexVersion"):
+        root.productIndexVersion = 0
+    if not hasattr(root, "productCount"):
+        root.productCount = BTrees.Length.Length(len(root.productIndexEntries))
+
+# Versioned schema steps, applied once in order by bootstrap_root()
+SCHEMA_STEPS = [
+    (1, partial(_create_trees, names=SCHEMA_TREES[1])),
+    (2, partial(_create_trees, names=SCHEMA_TREES[2])),
+    (3, partial(_create_trees, names=SCHEMA_TREES[3])),
+    (4, _create_catalog_version),
+    (5, partial(_create_trees, names=SCHEMA_TREES[5])),
+    (6, _version_catalog_journal),
+    (7, _create_product_index_state),
+]
+SCHEMA_VERSION = SCHEMA_STEPS[-1][0]
+BOOTSTRAP_RETRIES = 5
+bootstrap_stats = {}
+
+# Runs once per process at startup in its own transaction, so request
+# transactions never write the root object. Several workers starting together
+# may conflict; the loser retries and finds the schema already current.
+def bootstrap_root():
+    started = time.perf_counter()
+    tm = transaction.TransactionManager()
+    connection = db.open(transaction_manager=tm)
+    try:
+        for attempt in range(BOOTSTRAP_RETRIES):
+            try:
+                tm.begin()
+                root = connection.root()
+                version = getattr(root, "schema_version", 0)
+                for step_version, step in SCHEMA_STEPS:
+                    if step_version > version:
+                        step(root)
+                        root.schema_version = step_version
+                tm.commit()
+                break
+            except ConflictError:
+                tm.abort()
+                if attempt == BOOTSTRAP_RETRIES - 1:
+                    raise
+        bootstrap_stats.update({
+            'schema_version': connection.root().schema_version,
+            'previous_schema_version': version,
+            'bootstrap_ms': round((time.perf_counter() - started) * 1000, 3),
+        })
+        return bootstrap_stats
+    finally:
+        tm.abort()
+        connection.close()
 
-#Get a fresh connection and ensure root is initialized
 def get_connection():
     connection = db.open()
-    root = connection.root()
-    
-    # Initialize root attributes if they don't exist
-    if not hasattr(root, "objectModels"):
-        root.objectModels = BTrees.OOBTree.BTree()
-    if not hasattr(root, "textures"):
-        root.textures = BTrees.OOBTree.BTree()
-    if not hasattr(root, "displayScenes"):
-        root.displayScenes = BTrees.OOBTree.BTree()
-    if not hasattr(root, "objectItems"):
-        root.objectItems = BTrees.OOBTree.BTree()
-    if not hasattr(root, "ownedItems"):
-        root.ownedItems = BTrees.OOBTree.BTree()
-    if not hasattr(root, "containerOwnedItems"):
-        root.containerOwnedItems = BTrees.OOBTree.BTree()
-    if not hasattr(root, "nonContainerOwnedItems"):
-        root.nonContainerOwnedItems = BTrees.OOBTree.BTree()
-    if not hasattr(root, "products"):
-        root.products = BTrees.OOBTree.BTree()
-    if not hasattr(root, "digitalHomes"):
-        root.digitalHomes = BTrees.OOBTree.BTree()
-    if not hasattr(root, "homeObjectModels"):
-        root.homeObjectModels = BTrees.OOBTree.BTree()
-    if not hasattr(root, "placedItems"):
-        root.placedItems = BTrees.OOBTree.BTree()
-    
-    return connection, root
+    return connection, connection.root()
+
+def asset_key(tree, name, asset_id):
+    if isinstance(tree, BTrees.IOBTree.IOBTree):
+        return int(asset_id)
+    return f"{ASSET_KEY_PREFIXES[name]}{asset_id}"
+
+def get_asset(root, name, asset_id):
+    tree = getattr(root, name)
+    try:
+        return tree.get(asset_key(tree, name, asset_id))
+    except (TypeError, ValueError):
+        return None
+
+def has_asset(root, name, asset_id):
+    return get_asset(root, name, asset_id) is not None
+
+def set_asset(root, name, asset_id, asset):
+    tree = getattr(root, name)
+    tree[asset_key(tree, name, asset_id)] = asset
+
+def delete_asset(root, name, asset_id):
+    tree = getattr(root, name)
+    del tree[asset_key(tree, name, asset_id)]
+
+# Marks every node and bucket of a BTree as read, so the commit fails with a
+# ConflictError if another transaction changed any of them after the copy.
+def _read_current_tree(connection, node):
+    connection.readCurrent(node)
+    state = node.__getstate__()
+    # Empty, or a single bucket stored inline in the node itself
+    if not state or len(state) == 1:
+        return
+    for child in state[0][::2]:
+        if isinstance(child, type(node)):
+            _read_current_tree(connection, child)
+        else:
+            connection.readCurrent(child)
+
+# Online migration of one asset tree to an IOBTree. Only the tree is rebuilt;
+# the asset objects are shared, so this is cheap. The copied tree is read with
+# readCurrent, so a write to the old tree committed meanwhile makes the swap
+# conflict and the copy is simply redone instead of losing that write.
+def migrate_asset_tree(name, retries=5):
+    tm = transaction.TransactionManager()
+    connection = db.open(transaction_manager=tm)
+    try:
+        for attempt in range(retries):
+            try:
+                tm.begin()
+                root = connection.root()
+                old_tree = getattr(root, name)
+                if isinstance(old_tree, BTrees.IOBTree.IOBTree):
+                    return 0
+                _read_current_tree(connection, old_tree)
+                new_tree = BTrees.IOBTree.BTree()
+                for key, asset in old_tree.items():
+                    key_id = _key_to_id(key)
+                    if key_id is not None:
+                        new_tree[key_id] = asset
+                setattr(root, name, new_tree)
+                tm.commit()
+                return len(new_tree)
+            except ConflictError:
+                tm.abort()
+                if attempt == retries - 1:
+                    raise
+    finally:
+        tm.abort()
+        connection.close()
+
+# Read-only connections, kept in their own pool next to the DB's pool so
+# readers never take connections from writers. They stay open while idle, so
+# their caches stay warm across commits (historical connections are pooled
+# per tid, start cold after every write and are unreliable on history-free
+# RelStorage). Each has its own transaction manager: acquire() begins a new
+# transaction, which catches the connection up with every commit, and dooms
+# it so it can never be committed. Releasing a connection that was written
+# to raises ReadOnlyError after the changes are aborted.
+class ReadConnectionPool:
+    def __init__(self, size):
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self.stats = {'opened': 0, 'reused': 0, 'writes_rejected': 0}
+
+    def acquire(self):
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            connection = db.open(transaction_manager=transaction.TransactionManager())
+            self.stats['opened'] += 1
+        else:
+            self.stats['reused'] += 1
+        tm = connection.transaction_manager
+        tm.begin()
+        tm.doom()
+        return connection
+
+    def release(self, connection):
+        # Objects modified since begin(); abort() below clears the list
+        modified = bool(connection._registered_objects)
+        connection.transaction_manager.abort()
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(connection)
+                connection = None
+        if connection is not None:
+            connection.close()
+        if modified:
+            self.stats['writes_rejected'] += 1
+            raise ReadOnlyError("A read-only ZODB connection was modified")
+
+    def idle(self):
+        return len(self._idle)
+
+read_pool = ReadConnectionPool(getattr(settings, "ZODB_READ_POOL_SIZE", 16))
+
+# Connection handed out by get_read_connection(); close() gives it back to
+# the read pool instead of the DB pool.
+class ReadConnection:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            read_pool.release(connection)
+
+def open_read_connection():
+    return ReadConnection(read_pool.acquire())
+
+def get_read_connection():
+    connection = open_read_connection()
+    return connection, connection.root()
+
+# Request-scoped connection handle. The connection is taken from the DB pool on
+# first use and always aborted and returned to the pool by release().
+_request_connections = 0
+_request_connections_lock = threading.Lock()
+
+def _track_request_connection(delta):
+    global _request_connections
+    with _request_connections_lock:
+        _request_connections += delta
+
+class PooledConnection:
+    def __init__(self, read_only=False):
+        self.read_only = read_only
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = open_read_connection() if self.read_only else db.open()
+            _track_request_connection(1)
+        return self._connection
+
+    @property
+    def root(self):
+        return self.connection.root()
+
+    def is_open(self):
+        return self._connection is not None
+
+    def release(self):
+        if self._connection is None:
+            return
+        connection = self._connection
+        self._connection = None
+        try:
+            # The read pool aborts itself, after checking for writes
+            if not self.read_only:
+                connection.transaction_manager.abort()
+        finally:
+            try:
+                connection.close()
+            finally:
+                _track_request_connection(-1)
+
+@contextmanager
+def zodb_connection(read_only=False):
+    handle = PooledConnection(read_only)
+    try:
+        yield handle.connection, handle.root
+    finally:
+        handle.release()
+
+# Releases the handles once the response is done with them: right away for
+# ordinary responses, and when the server closes the response for streaming
+# ones, whose body (a blob file, a generator reading one) is read only after
+# the view has returned.
+def release_with_response(response, *handles):
+    if getattr(response, 'streaming', False):
+        for handle in handles:
+            response._resource_closers.append(handle.release)
+    else:
+        for handle in handles:
+            handle.release()
+    return response
+
+# Every view gets request.zodb, a connection joined to the thread's
+# transaction for writes, and request.zodb_read, a read-only connection from
+# the read pool. Each is opened on first use. Only management commands,
+# migrations and the sequence and pack helpers open their own connections.
+class ZODBConnectionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.zodb = PooledConnection()
+        request.zodb_read = PooledConnection(read_only=True)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            request.zodb.release()
+            request.zodb_read.release()
+            raise
+        return release_with_response(response, request.zodb, request.zodb_read)
+
+def get_pool_stats():
+    connections = db.connectionDebugInfo()
+    return {
+        'pool_size': db.getPoolSize(),
+        'pool_connections': len(connections),
+        'open_connections': sum(1 for info in connections if info.get('opened')),
+        'request_connections': _request_connections,
+        'cache_size': db.getCacheSize(),
+        'cached_objects': db.cacheSize(),
+        'read_pool_size': read_pool.size,
+        'read_pool_idle': read_pool.idle(),
+        'read_pool': dict(read_pool.stats),
+        'bootstrap': bootstrap_stats,
+    }
 
 def close_zodb():
     db.close()
     storage.close()
-    file_storage.close()
\ No newline at end of file
+    release_zeo_client()
+
+# Persistent ID sequences, one per tree that mints integer IDs
+SEQUENCE_TREES = (
+    "objectItems",
+    "products",
+    "objectModels",
+    "textures",
+    "displayScenes",
+    "digitalHomes",
+    "homeObjectModels",
+    "containerOwnedItems",
+    "nonContainerOwnedItems",
+    "productImages",
+)
+SEQUENCE_RETRIES = 10
+
+class Sequence(persistent.Persistent):
+    def __init__(self, value=0):
+        self.value = value
+
+    def get_value(self):
+        return self.value
+
+def _key_to_id(key):
+    # Keys are ints, digit strings or prefixed strings like 'model_12'
+    if isinstance(key, int):
+        return key
+    tail = str(key).rsplit('_', 1)[-1]
+    if tail.isdigit() and not str(key).startswith('item_'):
+        return int(tail)
+    return None
+
+def max_tree_id(tree):
+    if not tree:
+        return 0
+    ids = [key_id for key_id in map(_key_to_id, tree.keys()) if key_id is not None]
+    return max(ids) if ids else 0
+
+# Allocate IDs in a short transaction on a private connection so the caller's
+# transaction never writes the counter. Conflicts are retried here, so callers
+# never see a ConflictError from ID allocation and each call is O(1).
+def allocate_ids(name, count=1):
+    tm = transaction.TransactionManager()
+    connection = db.open(transaction_manager=tm)
+    try:
+        for attempt in range(SEQUENCE_RETRIES):
+            try:
+                tm.begin()
+                root = connection.root()
+                sequence = root.sequences.get(name)
+                if sequence is None:
+                    sequence = Sequence(max_tree_id(getattr(root, name, None)))
+                    root.sequences[name] = sequence
+                first_id = sequence.value + 1
+                sequence.value += count
+                tm.commit()
+                return first_id
+            except ConflictError:
+                tm.abort()
+                if attempt == SEQUENCE_RETRIES - 1:
+                    raise
+    finally:
+        tm.abort()
+        connection.close()
+
+# next_id() hands out IDs from a block reserved per process, so a run of
+# allocations (one owned item per unit of an order) costs one commit per
+# ZODB_ID_BLOCK_SIZE IDs instead of one each. IDs left in a block when the
+# process exits are never used, and IDs from different processes interleave.
+ID_BLOCK_SIZE = getattr(settings, "ZODB_ID_BLOCK_SIZE", 32)
+_id_blocks = {}
+_id_blocks_lock = threading.Lock()
+
+def next_id(name):
+    with _id_blocks_lock:
+        next_value, end = _id_blocks.get(name, (0, 0))
+        if next_value >= end:
+            next_value = allocate_ids(name, ID_BLOCK_SIZE)
+            end = next_value + ID_BLOCK_SIZE
+        _id_blocks[name] = (next_value + 1, end)
+        return next_value
+
+# One-shot migration: seed every sequence from the keys already in its tree.
+# Counters are never lowered, so running it again is harmless.
+def seed_sequences():
+    tm = transaction.TransactionManager()
+    connection = db.open(transaction_manager=tm)
+    try:
+        tm.begin()
+        root = connection.root()
+        seeded = {}
+        for name in SEQUENCE_TREES:
+            current = max_tree_id(getattr(root, name, None))
+            sequence = root.sequences.get(name)
+            if sequence is None:
+                root.sequences[name] = sequence = Sequence(current)
+            elif sequence.value < current:
+                sequence.value = current
+            seeded[name] = sequence.value
+        tm.commit()
+        return seeded
+    except Exception:
+        tm.abort()
+        raise
+    finally:
+        connection.close()
+
+# Pack and blob garbage collection. FileStorage pack also drops unreachable
+# objects and BlobStorage removes the blob files they referenced.
+pack_stats = {}
+_pack_lock = threading.Lock()
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+def storage_sizes():
+    sizes = {'storage_bytes': db.getSize(), 'file_bytes': None, 'blob_bytes': None}
+    if getattr(settings, "ZODB_STORAGE", "file") == "file":
+        sizes['file_bytes'] = os.path.getsize(ZODB_FILE)
+        sizes['blob_bytes'] = _dir_size(BLOB_DIR)
+    return sizes
+
+def _on_disk(sizes):
+    if sizes['file_bytes'] is None:
+        return sizes['storage_bytes']
+    return sizes['file_bytes'] + sizes['blob_bytes']
+
+def pack_zodb(days=None):
+    if days is None:
+        days = getattr(settings, "ZODB_PACK_DAYS", 7)
+    with _pack_lock:
+        before = storage_sizes()
+        started = time.perf_counter()
+        db.pack(days=days)
+        # FileStorage keeps the unpacked file as zodb.fs.old
+        old_file = ZODB_FILE + '.old'
+        if not getattr(settings, "ZODB_PACK_KEEP_OLD", False) and os.path.exists(old_file):
+            os.remove(old_file)
+        duration = time.perf_counter() - started
+        after = storage_sizes()
+        pack_stats.update({
+            'packed_at': time.time(),
+            'retention_days': days,
+            'duration_seconds': round(duration, 3),
+            'before': before,
+            'after': after,
+            'reclaimed_bytes': _on_disk(before) - _on_disk(after),
+            'last_error': None,
+        })
+        return dict(pack_stats)
+
+def get_pack_stats():
+    return dict(pack_stats)
+
+def _pack_scheduler(interval_seconds):
+    while True:
+        time.sleep(interval_seconds)
+        try:
+            pack_zodb()
+        except Exception as e:
+            pack_stats['last_error'] = str(e)
+
+# Optional in-process scheduler (ZODB_PACK_INTERVAL_HOURS > 0), started only
+# by the WSGI/ASGI entry points so management commands never run one. A lock
+# file keeps it to one process per host, e.g. one of several ZEO client workers.
+_pack_scheduler_lock = None
+
+def start_pack_scheduler():
+    global _pack_scheduler_lock
+    interval_hours = getattr(settings, "ZODB_PACK_INTERVAL_HOURS", 0)
+    if not interval_hours or _pack_scheduler_lock is not None:
+        return False
+    import zc.lockfile
+    try:
+        _pack_scheduler_lock = zc.lockfile.LockFile(os.path.join(ZODB_DIR, 'pack-scheduler.lock'))
+    except zc.lockfile.LockError:
+        return False
+    threading.Thread(target=_pack_scheduler, args=(interval_hours * 3600,), name='zodb-pack', daemon=True).start()
+    return True
+
+bootstrap_root()
@@ -265,6 +265,17 @@ function normalizeImageUrl(imageValue) {
   return "data:" + mime + ";base64," + s;
 }
 
+// Products with blob-backed images only carry image_urls; older ones still
+// send the inline base64 image.
+function productImageUrl(product) {
+  const urls = product.image_urls;
+  if (urls) {
+    const path = urls.large || urls.medium;
+    if (path) return getApiBase().replace(/\/$/, "") + path;
+  }
+  return normalizeImageUrl(product.image);
+}
+
 function createClockWidgetPreview() {
   const group = new THREE.Group();
   const width = 512;
@@ -931,7 +942,7 @@ async function fetchProductData(productId) {
       digiElem.textContent = `$${state.productData.digital_price ?? 0}`;
 
     if (isWallpaper(state.productData)) {
-      const imageUrl = normalizeImageUrl(state.productData.image);
+      const imageUrl = productImageUrl(state.productData);
       if (imageUrl) {
         await showWallpaperPreview(imageUrl);
         if (state.isWallpaperMode) {
@@ -951,20 +962,23 @@ async function fetchProductData(productId) {
         showWidgetPreview(widgetType);
       }
     } else {
-      await fetch3DModel(modelId);
+      await fetch3DModel(modelId, state.productData.model_url);
       await fetchAndRenderTextures(modelId);
     }
     if (state.productData.display_scenes_ids)
-      await fetchDisplayScenes(state.productData.display_scenes_ids);
+      await fetchDisplayScenes(state.productData.display_scenes_ids, state.productData.display_scene_urls);
   } catch (err) {
     console.error("Error fetching product data:", err);
   }
 }
 
-async function fetch3DModel(modelId) {
+// Versioned URLs from the product detail are cached as immutable; the bare
+// id URL is the fallback and revalidates with the ETag.
+async function fetch3DModel(modelId, modelUrl) {
   const api = getApiBase();
   try {
-    const res = await fetch(`${api}/products/get_3d_model/${modelId}/`, {
+    const path = modelUrl || `/products/get_3d_model/${modelId}/`;
+    const res = await fetch(`${api}${path}`, {
       credentials: "include",
     });
 
@@ -983,13 +997,14 @@ async function fetch3DModel(modelId) {
   }
 }
 
-async function fetchDisplayScenes(ids) {
+async function fetchDisplayScenes(ids, urls) {
   const api = getApiBase();
   state.sceneUrls = [];
 
-  for (const id of ids) {
+  for (const [i, id] of ids.entries()) {
     try {
-      const res = await fetch(`${api}/products/get_display_scene/${id}/`, {
+      const path = urls?.[i] || `/products/get_display_scene/${id}/`;
+      const res = await fetch(`${api}${path}`, {
         credentials: "include",
       });
 
@@ -1254,7 +1269,9 @@ async function fetchAndRenderTextures(modelId) {
 
   try {
     
-    const res = await fetch(`${api}/products/get_texture/${modelId}/`, {
+    // The manifest lists each texture's versioned URL; the swatch images
+    // then load them in parallel as raw bytes from the HTTP cache.
+    const res = await fetch(`${api}/products/texture_manifest/${modelId}/`, {
       credentials: "include",
     });
 
@@ -1275,27 +1292,10 @@ async function fetchAndRenderTextures(modelId) {
 
     console.info(`[Textures] Found ${entries.length} texture(s) for model ${modelId}`);
 
-    const textures = [];
-    for (let i = 0; i < entries.length; i++) {
-      const entry = entries[i];
-      try {
-       
-        const binaryString = atob(entry.file);
-        const bytes = new Uint8Array(binaryString.length);
-        for (let j = 0; j < binaryString.length; j++) {
-          bytes[j] = binaryString.charCodeAt(j);
-        }
-        const blob = new Blob([bytes], { type: "image/jpeg" });
-        const objectUrl = URL.createObjectURL(blob);
-
-        textures.push({
-          name: entry.name || `Texture ${i + 1}`,
-          imageUrl: objectUrl,
-        });
-      } catch (err) {
-        console.warn(`[Textures] Failed to decode texture_id=${entry.texture_id}:`, err);
-      }
-    }
+    const textures = entries.map((entry, i) => ({
+      name: entry.name || `Texture ${i + 1}`,
+      imageUrl: `${api}${entry.url}`,
+    }));
 
     renderTextureSwatches(textures);
 
@@ -6,4 +6,13 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(os.path.join(BASE_DIR.parent, '.env'))
 
 API_BASE_URL = os.getenv("API_URL", "http://localhost:8001")
-PRODUCT_DEMO_URL = os.getenv("PRODUCT_DEMO_URL", "http://localhost:5174")
\ No newline at end of file
+PRODUCT_DEMO_URL = os.getenv("PRODUCT_DEMO_URL", "http://localhost:5174")
+
+# Products carry thumbnail URLs; items not yet migrated still send inline base64
+def product_image_src(product, size="medium", placeholder="/placeholder.png"):
+    image_urls = product.get("image_urls")
+    if image_urls:
+        return f"{API_BASE_URL}{image_urls[size]}"
+    if product.get("image"):
+        return f"data:image/png;base64,{product['image']}"
+    return placeholder
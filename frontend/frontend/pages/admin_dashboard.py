@@ -1,7 +1,7 @@
 import reflex as rx
 from typing import List, Dict
 from ..state import AuthState
-from ..config import API_BASE_URL
+from ..config import API_BASE_URL, product_image_src
 import httpx
 import uuid
 import traceback
@@ -187,14 +187,14 @@ class AdminDashboardState(rx.State):
             auth_state = await self.get_state(AuthState)
 
         
-            filter_body = {}
+            filter_body = {"fields": "id,name,description,category,digital_price,physical_price,image"}
 
             async with httpx.AsyncClient(timeout=timeout) as client:
                 cookies_dict = auth_state.session_cookies or {}
 
                 response = await client.post(
                     f"{API_BASE_URL}/products/list/",  
-                    json=filter_body,               
+                    data=filter_body,               
                     cookies=cookies_dict,
                 )
 
@@ -218,11 +218,7 @@ class AdminDashboardState(rx.State):
                     "physical_price": p.get("physical_price", "0"),
                     
             
-                    "image": (
-                        f"data:image/png;base64,{p['image']}"
-                        if p.get("image")
-                        else "/placeholder.png"
-                    ),
+                    "image": product_image_src(p, "small"),
                 })
 
     
@@ -3,7 +3,7 @@ import reflex as rx
 from typing import List, Optional
 from ..template import template
 from ..state import AuthState
-from ..config import API_BASE_URL
+from ..config import API_BASE_URL, product_image_src
 from ..pages.orders import OrdersState
 from ..components.navbar import NavCartState
 import traceback
@@ -218,6 +218,7 @@ class CartState(rx.State):
                             
                             product_response = await client.get(
                                 f"{API_BASE_URL}/products/get_product_detail/{product_id}/",
+                                params={"fields": "id,name,digital_price,physical_price,image"},
                                 cookies=cookies_dict,
                                 timeout=10.0
                             )
@@ -247,7 +248,7 @@ class CartState(rx.State):
                                     price=price,
                                     quantity=item.get('quantity', 1),
                                     colors=["#C0C0C0", "#F5F5DC", "#D2B48C"],
-                                    image=f"data:image/png;base64,{product_data.get('image')}",
+                                    image=product_image_src(product_data, "small"),
                                     item_type=item_type
                                 )
                                 
@@ -30,6 +30,7 @@ class CategoryState(rx.State):
     selected_category: str = ""  
     is_loading: bool = False
     error_message: str = ""
+    categories_etag: str = ""
 
     async def load_categories(self):
       
@@ -39,12 +40,18 @@ class CategoryState(rx.State):
         self.is_loading = True
         try:
             async with httpx.AsyncClient() as client:
+                # Revalidate instead of re-downloading when nothing changed
+                headers = {"If-None-Match": self.categories_etag} if self.categories_etag and self.category_items else {}
                 response = await client.get(
                     f"{API_BASE_URL}/products/categories/",
                     cookies=cookies_dict,
+                    headers=headers,
                 )
 
+                if response.status_code == 304:
+                    return
                 if response.status_code == 200:
+                    self.categories_etag = response.headers.get("ETag", "")
                     data = response.json()
                     raw_categories = data.get("categories", [])
 
@@ -2,7 +2,7 @@ import reflex as rx
 from typing import List, Any
 from ..template import template
 from ..state import AuthState
-from ..config import API_BASE_URL
+from ..config import API_BASE_URL, product_image_src
 from datetime import datetime, timedelta
 import uuid
 
@@ -247,13 +247,13 @@ class OrdersState(rx.State):
                                 # Fetch product details
                                 product_response = await client.get(
                                     f"{API_BASE_URL}/products/get_product_detail/{product_id}/",
+                                    params={"fields": "id,digital_price,physical_price,image"},
                                     cookies=cookies_dict,
                                     timeout=10.0
                                 )
                                 
                                 if product_response.status_code == 200:
                                     product_data = product_response.json().get('product', {})
-                                    image = product_data.get('image', '')
                                     
                                     # Get price based on item type
                                     item_type = item.get('type', 'physical')
@@ -265,7 +265,7 @@ class OrdersState(rx.State):
                                     # Enrich item with image and price
                                     enriched_item = {
                                         **item,
-                                        'image': f"data:image/png;base64,{image}" if image else "/placeholder.jpg",
+                                        'image': product_image_src(product_data, "small", "/placeholder.jpg"),
                                         'price': price
                                     }
                                     enriched_items.append(enriched_item)
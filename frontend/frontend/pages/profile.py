@@ -8,7 +8,7 @@ from typing import Optional, Callable, Any,List,Dict
 import json
 import random
 import string
-from ..config import API_BASE_URL
+from ..config import API_BASE_URL, product_image_src
 import base64,uuid
 from ..components.navbar import NavCartState
 
@@ -1756,7 +1756,7 @@ class WishlistProductState(rx.State):
                             "category": p.get("category", "Uncategorized"),
                             "digital_price": p.get("digital_price", "0"),
                             "physical_price": p.get("physical_price", "0"),
-                            "image": f"data:image/png;base64,{p['image']}" if p.get("image") else "/placeholder.png",
+                            "image": product_image_src(p),
                             "rating": "4.6",
                             "link": f"/details/{p.get('id')}",
                         }
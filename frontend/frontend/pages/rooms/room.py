@@ -1,11 +1,13 @@
 import reflex as rx
 from ...state import DynamicState, AuthState
 from ...template import template
-from ...config import API_BASE_URL
+from ...config import API_BASE_URL, product_image_src
 import httpx
 import asyncio
 from ...components.product_card import product_card
 
+ROOM_PRODUCT_FIELDS = "id,name,category,digital_price,physical_price,image"
+
 class RoomState(rx.State):
     product_types: list[str] = []
     selected_product_type: str = ""
@@ -77,7 +79,7 @@ class RoomState(rx.State):
                  
                     response = await client.post(
                         f"{API_BASE_URL}/products/list/",
-                        data={"category": room_title},
+                        data={"category": room_title, "fields": ROOM_PRODUCT_FIELDS},
                         cookies=cookies_dict,
                     )
                 else:
@@ -86,7 +88,8 @@ class RoomState(rx.State):
                         f"{API_BASE_URL}/products/list/",
                         data={
                             "category": room_title,
-                            "product_type": product_type
+                            "product_type": product_type,
+                            "fields": ROOM_PRODUCT_FIELDS
                         },
                         cookies=cookies_dict,
                     )
@@ -102,7 +105,7 @@ class RoomState(rx.State):
                     "category": p.get("category", "Uncategorized"),
                     "digital_price": p.get("digital_price", "0"),
                     "physical_price": p.get("physical_price", "0"),
-                    "image": f"data:image/png;base64,{p['image']}" if p.get("image") else "/placeholder.png",
+                    "image": product_image_src(p),
                     "rating": str(p.get("rating", "4.6")), 
                     "hover_image": "/images/default_hover.png", 
                     "link": f"/details/{p.get('id')}",  
@@ -1,15 +1,23 @@
 import reflex as rx 
 from ..template import template 
 from reflex.components.component import NoSSRComponent 
-from typing import Dict, List 
+from typing import Dict, List, Optional 
 import httpx
 from ..state import AuthState
 from ..components.navbar import NavCartState
-from ..config import API_BASE_URL
+from ..config import API_BASE_URL, product_image_src
+
+PRODUCTS_PAGE_SIZE = 24
+SHOP_PRODUCT_FIELDS = "id,name,category,digital_price,physical_price,image,rating"
 
 class ShopState(rx.State):
 
     products: List[Dict] = []
+    next_cursor: str = ""
+    suggestions: List[Dict] = []
+    category_facets: List[Dict] = []
+    total_products: int = 0
+    is_loading_more: bool = False
     search_query: str = ""
     category: str = "All Categories"
     price_sort: str = "All Prices"
@@ -33,6 +41,36 @@ class ShopState(rx.State):
 
     def set_search_query(self, value: str):
         self.search_query = value
+        if value and self.sort_by == "Most Popular":
+            self.sort_by = "Best Match"
+        elif not value and self.sort_by == "Best Match":
+            self.sort_by = "Most Popular"
+        if not value:
+            self.suggestions = []
+            return ShopState.load_products
+        return ShopState.fetch_suggestions
+
+    async def fetch_suggestions(self):
+        query = self.search_query
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.get(
+                    f"{API_BASE_URL}/products/suggest/",
+                    params={"q": query, "limit": 8},
+                )
+            # Drop answers to a query the user has already typed past
+            if response.status_code == 200 and query == self.search_query:
+                self.suggestions = response.json().get("suggestions", [])
+        except Exception as e:
+            print(f"❌ Error loading suggestions: {e}")
+
+    def select_suggestion(self, name: str):
+        self.search_query = name
+        self.suggestions = []
+        return ShopState.load_products
+
+    def search_products(self):
+        self.suggestions = []
         return ShopState.load_products
 
     def set_category(self, value: str):
@@ -47,13 +85,9 @@ class ShopState(rx.State):
     def set_sort_by(self, value: str):
         self.sort_by = value
 
-    async def load_products(self):
-
-        auth_state = await self.get_state(AuthState)
-        cookies_dict = auth_state.session_cookies or {}
-    
-        
+    def _product_filters(self) -> Dict:
         sort_mapping = {
+            "Best Match": "relevance",
             "Most Popular": "popularity",
             "Newest": "newest",
             "Digital Price: Low to High": "digital_price_low_to_high",
@@ -68,7 +102,7 @@ class ShopState(rx.State):
             "Digital": "digital"
         }
         
-        form_data = {}
+        form_data = {"limit": PRODUCTS_PAGE_SIZE, "fields": SHOP_PRODUCT_FIELDS}
         
         if self.search_query:
             form_data["search_query"] = self.search_query
@@ -82,35 +116,79 @@ class ShopState(rx.State):
         if self.sort_by:
             form_data["sort_by"] = sort_mapping.get(self.sort_by, "popularity")
 
+        return form_data
+
+    async def _fetch_products_page(self, cursor: str = "") -> Optional[List[Dict]]:
+        auth_state = await self.get_state(AuthState)
+        cookies_dict = auth_state.session_cookies or {}
+
+        form_data = self._product_filters()
+        if cursor:
+            form_data["cursor"] = cursor
+
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"{API_BASE_URL}/products/list/", 
+                data=form_data,
+                cookies=cookies_dict,
+            )
         
+        if response.status_code != 200:
+            return None
+        
+        data = response.json()
+        self.next_cursor = data.get("next_cursor") or ""
+        self.total_products = data.get("total") if data.get("total") is not None else -1
+        return [
+            {
+                "id": p.get("id"),
+                "title": p.get("name", "Untitled Product"),
+                "description": p.get("description", ""),
+                "category": p.get("category", "Uncategorized"),
+                "digital_price": p.get("digital_price", "0"),
+                "physical_price": p.get("physical_price", "0"),
+                "image": product_image_src(p),
+                "rating": str(p.get("rating", "4.6")), 
+                "hover_image": "/images/default_hover.png", 
+                "link": f"/details/{p.get('id')}",  
+            }
+            for p in data.get("products", [])
+        ]
+
+    async def load_facets(self):
+        form_data = {
+            key: value
+            for key, value in self._product_filters().items()
+            if key in ("search_query", "category", "format")
+        }
         try:
             async with httpx.AsyncClient() as client:
-        
                 response = await client.post(
-                    f"{API_BASE_URL}/products/list/", 
+                    f"{API_BASE_URL}/products/facets/",
                     data=form_data,
-                    cookies=cookies_dict,
                 )
-            
             if response.status_code != 200:
+                self.category_facets = []
                 return
-            
-            data = response.json()
-            self.products = [
-                {
-                    "id": p.get("id"),
-                    "title": p.get("name", "Untitled Product"),
-                    "description": p.get("description", ""),
-                    "category": p.get("category", "Uncategorized"),
-                    "digital_price": p.get("digital_price", "0"),
-                    "physical_price": p.get("physical_price", "0"),
-                    "image": f"data:image/png;base64,{p['image']}" if p.get("image") else "/placeholder.png",
-                    "rating": str(p.get("rating", "4.6")), 
-                    "hover_image": "/images/default_hover.png", 
-                    "link": f"/details/{p.get('id')}",  
-                }
-                for p in data.get("products", [])
+            self.category_facets = [
+                {"value": facet.get("value", ""), "count": facet.get("count", 0)}
+                for facet in response.json().get("categories", [])
+                if facet.get("value", "").lower() != "widget"
             ]
+        except Exception as e:
+            print(f"❌ Error loading facets: {e}")
+
+    def select_category_facet(self, value: str):
+        self.category = value
+        return ShopState.load_products
+
+    async def load_products(self):
+        try:
+            products = await self._fetch_products_page()
+            if products is None:
+                return
+            self.products = products
+            await self.load_facets()
             
             # Reload wishlist to ensure fresh data
             await self.fetch_wishlist()
@@ -118,6 +196,19 @@ class ShopState(rx.State):
         except Exception as e:
             print(f"❌ Error loading products: {e}")
 
+    async def load_more_products(self):
+        if not self.next_cursor or self.is_loading_more:
+            return
+        self.is_loading_more = True
+        try:
+            products = await self._fetch_products_page(self.next_cursor)
+            if products is not None:
+                self.products = self.products + products
+        except Exception as e:
+            print(f"❌ Error loading more products: {e}")
+        finally:
+            self.is_loading_more = False
+
 
     async def add_to_cart(self, product_id: int, item_type: str, quantity: int = 1):
         
@@ -259,15 +350,73 @@ class ShopState(rx.State):
             self.model_filename = ""
 
 
+def search_suggestions() -> rx.Component:
+    return rx.cond(
+        ShopState.suggestions.length() > 0,
+        rx.vstack(
+            rx.foreach(
+                ShopState.suggestions,
+                lambda suggestion: rx.text(
+                    suggestion["name"],
+                    on_click=ShopState.select_suggestion(suggestion["name"]),
+                    width="100%",
+                    padding="6px 12px",
+                    cursor="pointer",
+                    font_family="Poppins",
+                    _hover={"background_color": "#F1F5F9"},
+                ),
+            ),
+            position="absolute",
+            top="100%",
+            left="0",
+            width="100%",
+            spacing="0",
+            background_color="white",
+            border="1px solid #E2E8F0",
+            border_radius="12px",
+            z_index="10",
+            margin_top="4px",
+        ),
+    )
+
+
+def category_facet_chips() -> rx.Component:
+    return rx.cond(
+        ShopState.category_facets.length() > 0,
+        rx.hstack(
+            rx.foreach(
+                ShopState.category_facets,
+                lambda facet: rx.badge(
+                    facet["value"], " · ", facet["count"],
+                    on_click=ShopState.select_category_facet(facet["value"]),
+                    color_scheme=rx.cond(ShopState.category == facet["value"], "orange", "gray"),
+                    radius="full",
+                    size="2",
+                    cursor="pointer",
+                ),
+            ),
+            spacing="2",
+            wrap="wrap",
+            justify="center",
+            width="100%",
+        ),
+    )
+
+
 def search_and_filters() -> rx.Component:
     return rx.hstack(
-        rx.input(
-            rx.input.slot(rx.icon("search")),
-            placeholder="Search...",
-            value=ShopState.search_query,
-            on_change=lambda e: ShopState.set_search_query(e.to(str)),
-            radius = "full", size ="2", width ="20%",
-            
+        rx.box(
+            rx.input(
+                rx.input.slot(rx.icon("search")),
+                placeholder="Search...",
+                value=ShopState.search_query,
+                on_change=lambda e: ShopState.set_search_query(e.to(str)),
+                radius = "full", size ="2", width ="100%",
+                
+            ),
+            search_suggestions(),
+            position="relative",
+            width="20%",
         ),
  
         rx.select(
@@ -284,6 +433,7 @@ def search_and_filters() -> rx.Component:
         ),
         rx.select(
             [
+                "Best Match",
                 "Most Popular", 
                 "Newest",
                 "Digital Price: Low to High",
@@ -296,7 +446,7 @@ def search_and_filters() -> rx.Component:
             width ="20%" , 
             height="40px", radius = "full"
         ),
-        rx.button("Search", on_click=ShopState.load_products,radius="full",background_color = "#22282c",width="8%",font_weight="bold",cursor = "pointer"),
+        rx.button("Search", on_click=ShopState.search_products,radius="full",background_color = "#22282c",width="8%",font_weight="bold",cursor = "pointer"),
         spacing="2",
         justify="center",
         width="100%",
@@ -466,6 +616,43 @@ def product_card(product: Dict) -> rx.Component:
         )
 
 
+def infinite_scroll_listener() -> rx.Component:
+    return rx.script("""
+        (function() {
+            if (window._shopScrollListenerAttached) return;
+            window._shopScrollListenerAttached = true;
+            window.addEventListener('scroll', function() {
+                const button = document.getElementById('shop-load-more');
+                if (!button || button.disabled) return;
+                if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 600) {
+                    button.click();
+                }
+            }, { passive: true });
+        })();
+    """)
+
+
+def load_more_button() -> rx.Component:
+    return rx.cond(
+        ShopState.next_cursor != "",
+        rx.center(
+            rx.button(
+                "Load more",
+                id="shop-load-more",
+                on_click=ShopState.load_more_products,
+                loading=ShopState.is_loading_more,
+                disabled=ShopState.is_loading_more,
+                radius="full",
+                background_color="#22282c",
+                font_weight="bold",
+                cursor="pointer",
+            ),
+            width="100%",
+            padding="20px",
+        ),
+    )
+
+
 def shop_content() -> rx.Component:
 
     return rx.vstack(
@@ -489,6 +676,16 @@ def shop_content() -> rx.Component:
             width = "100%",
         ),
         search_and_filters(),
+        category_facet_chips(),
+        rx.cond(
+            ShopState.total_products > 0,
+            rx.text(
+                "Showing ", ShopState.products.length(), " of ", ShopState.total_products, " products",
+                font_size="0.9em",
+                color="#64748B",
+                font_family="Poppins",
+            ),
+        ),
         rx.cond(
                 ShopState.products,
                 rx.grid(
@@ -509,6 +706,8 @@ def shop_content() -> rx.Component:
                     height="400px",
                 ),
             ),
+            load_more_button(),
+            infinite_scroll_listener(),
             
             spacing="4",
             width="100%",